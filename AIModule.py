@@ -1,19 +1,113 @@
-from sklearn.linear_model import LinearRegression
+import os
+import struct
+from collections import deque
+
 import numpy as np
 
+PERFORMANCE_HISTORY = 50  # recent levels kept in performance_data
+SCORE_SCALE = 1000  # scores are divided by this so both features have similar magnitudes
+
+# Saved model file: header, then weights and covariance of both models, then
+# the performance_data records, all little-endian float64
+MODEL_MAGIC = b'CCAI'
+MODEL_VERSION = 1
+MODEL_HEADER = struct.Struct('<4sHHIdI')  # magic, version, features, observations, forgetting, records
+RECORD_FIELDS = ('level', 'moves_used', 'score', 'time_used')
+
+
+class RecursiveLeastSquares:
+    """Linear regression (with intercept) updated one observation at a time
+
+    Each update is O(1) in the number of observations seen so far. With
+    forgetting < 1 older observations are down-weighted exponentially, so
+    the model follows a player whose skill changes.
+    """
+
+    def __init__(self, n_features, forgetting=1.0, initial_variance=1e6):
+        self.forgetting = forgetting
+        self.weights = np.zeros(n_features + 1)
+        self.covariance = np.eye(n_features + 1) * initial_variance
+
+    def update(self, features, target):
+        x = np.append(1.0, features)
+        px = self.covariance @ x
+        gain = px / (self.forgetting + x @ px)
+        self.weights += gain * (target - x @ self.weights)
+        self.covariance = (self.covariance - np.outer(gain, px)) / self.forgetting
+
+    def predict(self, features):
+        return float(np.append(1.0, features) @ self.weights)
+
 
 class AIModule:
-    def __init__(self):
-        self.performance_data = []
-        self.move_model = LinearRegression()
-        self.time_model = LinearRegression()  # New model for time prediction
+    def __init__(self, forgetting=1.0, model_path=None):
+        self.performance_data = deque(maxlen=PERFORMANCE_HISTORY)
+        # Online models of moves and seconds used, from (score, level)
+        self.move_model = RecursiveLeastSquares(2, forgetting)
+        self.time_model = RecursiveLeastSquares(2, forgetting)  # New model for time prediction
+        self.observations = 0
         self.base_difficulty = 20
         self.base_time_limit = 60  # Initial time limit (1 minute)
         self.trained = False
         self.ai_activated_shown = False
+        # The model saved at model_path is only read the first time it is needed
+        self.model_path = model_path
+        self.loaded = model_path is None
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            with open(self.model_path, 'rb') as f:
+                self.read_model(f.read())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Ignoring unreadable AI model {self.model_path}: {e}")
+
+    def read_model(self, data):
+        magic, version, features, observations, forgetting, records = MODEL_HEADER.unpack_from(data)
+        if magic != MODEL_MAGIC or version != MODEL_VERSION or features != 2:
+            raise ValueError("unsupported model file")
+        size = features + 1
+        values = np.frombuffer(data, dtype='<f8', offset=MODEL_HEADER.size)
+        if len(values) != 2 * (size + size * size) + records * len(RECORD_FIELDS):
+            raise ValueError("truncated model file")
+
+        offset = 0
+        for model in (self.move_model, self.time_model):
+            model.forgetting = forgetting
+            model.weights = values[offset:offset + size].copy()
+            model.covariance = values[offset + size:offset + size + size * size].reshape(size, size).copy()
+            offset += size + size * size
+        self.performance_data.clear()
+        for record in values[offset:].reshape(records, len(RECORD_FIELDS)).tolist():
+            self.performance_data.append(dict(zip(RECORD_FIELDS, record)))
+        self.observations = observations
+        self.trained = observations >= 2
+
+    def model_bytes(self):
+        header = MODEL_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, 2, self.observations,
+                                   self.move_model.forgetting, len(self.performance_data))
+        records = np.array([[d[field] for field in RECORD_FIELDS] for d in self.performance_data], dtype=float)
+        values = np.concatenate([self.move_model.weights, self.move_model.covariance.ravel(),
+                                 self.time_model.weights, self.time_model.covariance.ravel(),
+                                 records.ravel()])
+        return header + values.astype('<f8').tobytes()
+
+    def save(self):
+        """Write the model to model_path (atomically, so a crash can't leave half a file)"""
+        if self.model_path is None:
+            return
+        tmp_path = self.model_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.model_bytes())
+        os.replace(tmp_path, self.model_path)
 
     def record_performance(self, level, moves_left, score, time_taken):
         """Record player performance metrics"""
+        self.ensure_loaded()
         moves_used = self.base_difficulty - moves_left
         time_used = time_taken
 
@@ -23,42 +117,43 @@ class AIModule:
             'score': score,
             'time_used': time_used
         })
+        self.train_models(self.performance_data[-1])
 
-        if len(self.performance_data) >= 2:  # Need at least 2 data points
-            self.train_models()
+        try:
+            self.save()
+        except OSError as e:
+            print(f"Error saving AI model: {e}")
 
-    def train_models(self):
-        # Prepare data
-        X = np.array([[d['score'], d['level']] for d in self.performance_data])
-        y_moves = np.array([d['moves_used'] for d in self.performance_data])
-        y_time = np.array([d['time_used'] for d in self.performance_data])
+    def train_models(self, record):
+        """Update both models with one level's performance"""
+        features = (record['score'] / SCORE_SCALE, record['level'])
+        self.move_model.update(features, record['moves_used'])
+        self.time_model.update(features, record['time_used'])
+        self.observations += 1
 
-        # Train both models
-        self.move_model.fit(X, y_moves)
-        self.time_model.fit(X, y_time)
-        self.trained = True
+        if self.observations >= 2:  # Need at least 2 data points
+            self.trained = True
 
-        if not self.ai_activated_shown:
-            print("🤖 AI Activated! Now predicting moves and time requirements")
-            self.ai_activated_shown = True
+            if not self.ai_activated_shown:
+                print("🤖 AI Activated! Now predicting moves and time requirements")
+                self.ai_activated_shown = True
 
-    def calculate_difficulty(self):
+    def calculate_difficulty(self, level=None):
+        """(moves, seconds) for `level`, by default the one after the last recorded level"""
+        self.ensure_loaded()
         if self.trained and self.performance_data:
             last = self.performance_data[-1]
+            features = (last['score'] / SCORE_SCALE, last['level'] + 1 if level is None else level)
 
             # Predict moves needed
-            predicted_moves = self.move_model.predict(
-                [[last['score'], last['level'] + 1]]
-            )[0]
+            predicted_moves = self.move_model.predict(features)
 
             # Predict time needed (in seconds)
-            predicted_time = self.time_model.predict(
-                [[last['score'], last['level'] + 1]]
-            )[0]
+            predicted_time = self.time_model.predict(features)
 
             # Return both values (moves and time limit)
             return (
                 max(10, min(30, int(round(predicted_moves)) + 1)),  # moves
                 max(30, min(120, int(round(predicted_time)) + 10)  # seconds (30s-2min)
                     ))
-        return self.base_difficulty, self.base_time_limit
\ No newline at end of file
+        return self.base_difficulty, self.base_time_limit
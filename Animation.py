@@ -0,0 +1,189 @@
+from collections import deque
+
+import numpy as np
+
+
+class Tween:
+    """Calls update(progress) with progress going from 0 to 1 over `duration` ms"""
+
+    def __init__(self, duration, update):
+        self.duration = duration
+        self.update = update
+        self.elapsed = 0
+        self.previous = 0
+
+    def progress(self, elapsed):
+        return elapsed / self.duration if self.duration else 1.0
+
+    def __call__(self, dt):
+        self.previous = self.elapsed
+        self.elapsed = min(self.duration, self.elapsed + dt)
+        self.update(self.progress(self.elapsed))
+        return self.elapsed >= self.duration
+
+    def interpolate(self, alpha):
+        """Show the state `alpha` of the way from the previous step to the latest one"""
+        self.update(self.progress(self.previous + (self.elapsed - self.previous) * alpha))
+
+
+class AnimationQueue:
+    """Frame-driven scheduler for animations and the game-logic steps queued behind them
+
+    A step is a callable taking the elapsed ms since the last frame and
+    returning True once it is finished. The main loop calls update() once a
+    frame, so animations never block event handling or the timers. Steps run
+    in order; when one finishes, the next starts in the same frame with
+    dt=0, so logic steps (call()) chain without waiting a frame. A logic
+    step may queue further steps, which run after everything already queued.
+    """
+
+    def __init__(self):
+        self.steps = deque()
+
+    @property
+    def busy(self):
+        return bool(self.steps)
+
+    def add(self, step):
+        self.steps.append(step)
+
+    def tween(self, duration, update):
+        self.add(Tween(duration, update))
+
+    def until(self, advance):
+        """Run advance(dt) every frame until it returns False"""
+        self.add(lambda dt: not advance(dt))
+
+    def call(self, action):
+        """Run `action` once, after everything queued before it"""
+        def step(dt):
+            action()
+            return True
+        self.add(step)
+
+    def update(self, dt):
+        while self.steps:
+            step = self.steps[0]
+            if not step(dt):
+                return
+            self.steps.popleft()
+            dt = 0
+
+    def interpolate(self, alpha):
+        """Let the running tween show its state between logic steps (for rendering)"""
+        if self.steps and isinstance(self.steps[0], Tween):
+            self.steps[0].interpolate(alpha)
+
+    def clear(self):
+        self.steps.clear()
+
+
+class FallingTiles:
+    """Tiles falling into place, kept in preallocated parallel arrays
+
+    start() adds a batch of tiles; advance() moves every tile still falling
+    in one vectorized step and marks the ones that reached their cell. All
+    work happens in place in arrays sized for `capacity` tiles, and cells()
+    and positions() write their results into preallocated buffers too, so a
+    frame allocates no arrays however many tiles are falling. The arrays
+    are reused from the start once every tile has landed.
+    """
+
+    def __init__(self, capacity):
+        self.x = np.zeros(capacity, dtype=np.intp)  # board column
+        self.target = np.zeros(capacity, dtype=np.intp)  # board row the tile lands in
+        self.land_y = np.zeros(capacity)  # y in pixels at which it has landed
+        self.y = np.zeros(capacity)  # top of the tile in board pixels
+        self.prev_y = np.zeros(capacity)  # y before the last advance(), for interpolation
+        self.tile = np.zeros(capacity, dtype=np.int8)
+        self.falling = np.zeros(capacity, dtype=bool)
+        self.landed = np.zeros(capacity, dtype=bool)  # scratch for advance()
+        # Buffers for positions() and cells(): per slot, then packed to the tiles returned
+        self.slot_x = np.zeros(capacity, dtype=np.intp)
+        self.slot_y = np.zeros(capacity)
+        self.slot_shown = np.zeros(capacity, dtype=bool)
+        self.slot_inside = np.zeros(capacity, dtype=bool)
+        self.out_x = np.zeros(capacity, dtype=np.intp)
+        self.out_y = np.zeros(capacity)
+        self.out_column = np.zeros(capacity, dtype=np.intp)  # cells() has its own, as draw_all() uses both
+        self.out_row = np.zeros(capacity, dtype=np.intp)
+        self.out_tile = np.zeros(capacity, dtype=np.int8)
+        self.count = 0  # slots in use
+        self.remaining = 0  # tiles still falling
+        self.views()
+
+    def views(self):
+        # Views of the slots in use, made once per batch rather than every frame
+        n = self.count
+        self._falling, self._landed = self.falling[:n], self.landed[:n]
+        self._y, self._prev_y, self._land_y = self.y[:n], self.prev_y[:n], self.land_y[:n]
+        self._x, self._target, self._tile = self.x[:n], self.target[:n], self.tile[:n]
+        self._slot_x, self._slot_y = self.slot_x[:n], self.slot_y[:n]
+        self._slot_shown, self._slot_inside = self.slot_shown[:n], self.slot_inside[:n]
+
+    @property
+    def busy(self):
+        return self.remaining > 0
+
+    def start(self, x, y, target, land_y, tile):
+        """Add tiles at column x and pixel height y that land in row target at pixel height land_y"""
+        if not self.remaining:
+            self.count = 0
+        first, self.count = self.count, self.count + len(x)
+        batch = slice(first, self.count)
+        self.x[batch] = x
+        self.y[batch] = y
+        self.prev_y[batch] = y
+        self.target[batch] = target
+        self.land_y[batch] = land_y
+        self.tile[batch] = tile
+        self.falling[batch] = True
+        self.remaining += len(x)
+        self.views()
+
+    def advance(self, distance):
+        """Move every falling tile down by `distance` pixels; returns True while any is still falling"""
+        falling = self._falling
+        np.copyto(self._prev_y, self._y, where=falling)
+        np.add(self._y, distance, out=self._y, where=falling)
+        np.greater_equal(self._y, self._land_y, out=self._landed)
+        np.logical_and(self._landed, falling, out=self._landed)
+        np.logical_xor(falling, self._landed, out=falling)
+        self.remaining = int(np.count_nonzero(falling))
+        return self.remaining > 0
+
+    def cells(self):
+        """(xs, rows) of the cells the falling tiles will land in, valid until the next cells() call"""
+        n = self.remaining
+        xs, rows = self.out_column[:n], self.out_row[:n]
+        np.compress(self._falling, self._x, out=xs)
+        np.compress(self._falling, self._target, out=rows)
+        return xs, rows
+
+    def positions(self, alpha=1.0, scale=1, origin=(0, 0), clip=None):
+        """(xs, ys, tiles) of the falling tiles, ys interpolated `alpha` of the way from the last step
+
+        xs is the column times `scale`; `origin` is added to both. With `clip`
+        as (left, top, right, bottom) only the tiles positioned strictly
+        inside it are returned. The arrays are overwritten by the next call.
+        """
+        xs, ys, shown, inside = self._slot_x, self._slot_y, self._slot_shown, self._slot_inside
+        np.multiply(self._x, scale, out=xs)
+        xs += origin[0]
+        np.subtract(self._y, self._prev_y, out=ys)
+        ys *= alpha
+        ys += self._prev_y
+        ys += origin[1]
+        shown[:] = self._falling
+        if clip is not None:
+            left, top, right, bottom = clip
+            for values, bound, test in ((xs, left, np.greater), (ys, top, np.greater),
+                                        (xs, right, np.less), (ys, bottom, np.less)):
+                test(values, bound, out=inside)
+                shown &= inside
+
+        n = int(np.count_nonzero(shown))
+        out = self.out_x[:n], self.out_y[:n], self.out_tile[:n]
+        for values, packed in zip((xs, ys, self._tile), out):
+            np.compress(shown, values, out=packed)
+        return out
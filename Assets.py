@@ -0,0 +1,167 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+IMAGE_DIR = "images"
+ASSET_CACHE_DIR = "asset_cache"
+ATLAS_VERSION = 1  # bump when the atlas layout or file format changes
+
+TITLE_SIZE = (500, 300)
+
+CANDY_COLORS = {
+    'blue': (0, 0, 255),
+    'green': (0, 255, 0),
+    'orange': (255, 165, 0),
+    'purple': (128, 0, 128),
+    'red': (255, 0, 0),
+    'yellow': (255, 255, 0),
+}
+
+# Sprite name -> source file; tiles are scaled to the tile size, the title to TITLE_SIZE
+TILE_FILES = {f'{color} candy': f'{color}-candy.png' for color in CANDY_COLORS}
+TILE_FILES['blocker'] = 'rock.png'
+TILE_FILES['bomb'] = 'bomb.png'
+TITLE_FILE = 'Candy Crush Clone.png'
+
+# Font name -> (system font or None for pygame's default, size, bold)
+FONT_SPECS = {
+    'hud': (None, 32, False),
+    'large': (None, 68, False),
+    'input': (None, 48, False),
+    'title': ('Arial', 72, True),
+    'prompt': ('Arial', 36, False),
+    'profile': (None, 20, False),  # frame profiler overlay
+}
+
+
+def fallback_tile(name, tile_size):
+    """Drawn stand-in for a tile image that couldn't be loaded"""
+    surf = pygame.Surface((tile_size, tile_size), pygame.SRCALPHA)
+    if name == 'blocker':
+        surf.fill((100, 100, 100))  # Gray color
+        pygame.draw.rect(surf, (50, 50, 50), (2, 2, tile_size - 4, tile_size - 4), 0, 8)
+    elif name == 'bomb':
+        pygame.draw.circle(surf, (0, 0, 0), (tile_size // 2, tile_size // 2), tile_size // 2 - 5)
+        pygame.draw.circle(surf, (255, 0, 0), (tile_size // 2, tile_size // 2), tile_size // 2 - 10)
+        pygame.draw.rect(surf, (200, 200, 0), (tile_size // 2, 5, tile_size // 4, 5))
+    else:
+        color = CANDY_COLORS[name.split()[0]]
+        pygame.draw.rect(surf, color, (2, 2, tile_size - 4, tile_size - 4), 0, 10)
+    return surf
+
+
+def decode_scaled(path, size):
+    """Decode an image file and scale it to `size` (None if it can't be read)
+
+    Runs on worker threads, so it must not touch the display.
+    """
+    try:
+        image = pygame.image.load(path)
+    except (pygame.error, OSError):
+        return None
+    if image.get_size() == size:
+        return image
+    if image.get_bitsize() in (24, 32):
+        return pygame.transform.smoothscale(image, size)
+    return pygame.transform.scale(image, size)
+
+
+def file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return 'missing'
+
+
+def atlas_cache_path(tile_size, image_dir, cache_dir):
+    """Cache file for the atlas built from the current source files at this tile size"""
+    key = hashlib.sha256(f"{ATLAS_VERSION}:{tile_size}:{TITLE_SIZE}".encode())
+    for name in sorted(TILE_FILES) + [TITLE_FILE]:
+        key.update(f"{name}:{file_digest(os.path.join(image_dir, TILE_FILES.get(name, name)))}".encode())
+    return os.path.join(cache_dir, f"atlas_{tile_size}_{key.hexdigest()[:16]}.bin")
+
+
+def build_atlas(tile_size, image_dir):
+    """Decode and scale every sprite (in parallel) and pack them into one surface
+
+    Tiles go in a row under the title image. Returns the atlas and a
+    name -> (x, y, w, h) map of its regions.
+    """
+    jobs = {name: (os.path.join(image_dir, file), (tile_size, tile_size)) for name, file in TILE_FILES.items()}
+    jobs['title'] = (os.path.join(image_dir, TITLE_FILE), TITLE_SIZE)
+    with ThreadPoolExecutor(max_workers=min(8, len(jobs))) as pool:
+        decoded = dict(zip(jobs, pool.map(lambda job: decode_scaled(*job), jobs.values())))
+
+    title = decoded.pop('title')
+    title_height = TITLE_SIZE[1] if title is not None else 0
+    width = max(TITLE_SIZE[0] if title is not None else 0, tile_size * len(decoded))
+    atlas = pygame.Surface((width, title_height + tile_size), pygame.SRCALPHA)
+
+    regions = {}
+    if title is not None:
+        regions['title'] = (0, 0) + TITLE_SIZE
+        atlas.blit(title, (0, 0))
+    for i, (name, image) in enumerate(decoded.items()):
+        if image is None:
+            image = fallback_tile(name, tile_size)
+        regions[name] = (i * tile_size, title_height, tile_size, tile_size)
+        atlas.blit(image, regions[name][:2])
+    return atlas, regions
+
+
+def read_atlas(path):
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        pixels = f.read()
+    atlas = pygame.image.frombytes(pixels, tuple(header['size']), 'RGBA')
+    return atlas, {name: tuple(rect) for name, rect in header['regions'].items()}
+
+
+def write_atlas(path, atlas, regions):
+    """Store the raw RGBA pixels so later launches skip decoding and scaling"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = json.dumps({'size': atlas.get_size(), 'regions': regions})
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header.encode() + b'\n')
+        f.write(pygame.image.tobytes(atlas, 'RGBA'))
+    os.replace(tmp_path, path)
+
+
+def load_sprites(tile_size, image_dir=IMAGE_DIR, cache_dir=ASSET_CACHE_DIR):
+    """Name -> Surface for every tile sprite (and 'title' if its image exists)
+
+    All sprites are subsurfaces of one atlas, which is read from the disk
+    cache when the source images and tile size haven't changed. Needs the
+    display to be set up already.
+    """
+    path = atlas_cache_path(tile_size, image_dir, cache_dir)
+    try:
+        atlas, regions = read_atlas(path)
+    except (OSError, ValueError, KeyError, pygame.error):
+        atlas, regions = build_atlas(tile_size, image_dir)
+        try:
+            write_atlas(path, atlas, regions)
+        except OSError as e:
+            print(f"Could not cache sprite atlas: {e}")
+
+    atlas = atlas.convert_alpha()
+    return {name: atlas.subsurface(rect) for name, rect in regions.items()}
+
+
+def load_fonts():
+    """Resolve every font in FONT_SPECS once; system fonts fall back to pygame's default font"""
+    fonts = {}
+    for name, (family, size, bold) in FONT_SPECS.items():
+        if family is not None:
+            try:
+                fonts[name] = pygame.font.SysFont(family, size, bold=bold)
+                continue
+            except Exception:
+                pass
+        fonts[name] = pygame.font.Font(None, size)
+    return fonts
@@ -0,0 +1,436 @@
+"""Micro- and macro-benchmarks of the engine and renderer hot paths
+
+Every benchmark runs on fixed-seed boards, so two runs measure the same
+work. Boards come in several sizes and blocker/bomb densities; rendering
+runs headless on SDL's dummy video driver. Results are written as JSON
+and can be compared against a saved baseline:
+
+    python Benchmark.py --save baseline.json
+    python Benchmark.py --baseline baseline.json --threshold 0.15   # exits 1 on a regression
+
+--stress instead plays games on growing boards (up to 256x256) and reports
+moves per second of the engine and of the animated game, and frame times.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from collections import namedtuple
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import numpy as np
+
+from GameEngine import GameEngine, new_engine, BLOCKER, BOMB, EMPTY, IS_CANDY, TILE_NAMES
+
+SIZES = (8, 16, 32, 64)
+DENSITIES = ((0.0, 0.0), (0.05, 0.02), (0.15, 0.05))  # (blockers, bombs) as a fraction of the cells
+SEED = 12345
+RENDER_WIDTH = 800  # board width in pixels for the renderer benchmarks
+STRESS_SIZES = ((8, 8), (16, 16), (32, 32), (64, 64), (128, 128), (256, 256), (256, 32))  # (width, height)
+
+# One benchmark: `setup()` builds fresh (untimed) input for every run, `run(input)` is timed
+Benchmark = namedtuple('Benchmark', ['name', 'setup', 'run'])
+
+
+def make_board(size, blockers, bombs, seed=SEED, backend='numpy'):
+    """Settled, match-free board with the given share of blockers and bombs"""
+    engine = new_engine(backend, seed, size)
+    rng = np.random.default_rng(seed)
+    engine.grid[engine.grid == BLOCKER] = IS_CANDY.nonzero()[0][0]
+    engine.grid[engine.grid == BOMB] = IS_CANDY.nonzero()[0][0]
+    engine.blocker_positions.clear()
+    engine.bomb_positions.clear()
+
+    cells = rng.permutation(size * size)
+    n_blockers = int(blockers * size * size)
+    n_bombs = int(bombs * size * size)
+    for tile, positions, chosen in ((BLOCKER, engine.blocker_positions, cells[:n_blockers]),
+                                    (BOMB, engine.bomb_positions, cells[n_blockers:n_blockers + n_bombs])):
+        ys, xs = np.divmod(chosen, size)
+        engine.grid[ys, xs] = tile
+        positions.update(zip(xs.tolist(), ys.tolist()))
+
+    engine.legal_stale[...] = True
+    engine.ensure_no_matches_at_start()
+    engine.dirty[...] = False
+    engine.reshuffle_if_dead()
+    return engine
+
+
+def scramble(engine, seed=SEED):
+    """Copy of `engine` with every candy redrawn at random, so the board is full of matches"""
+    engine = engine.copy()
+    rng = np.random.default_rng(seed)
+    candies = IS_CANDY[engine.grid]
+    engine.grid[candies] = rng.choice(IS_CANDY.nonzero()[0], np.count_nonzero(candies)).astype(np.int8)
+    engine.dirty[...] = True
+    engine.legal_stale[...] = True
+    return engine
+
+
+def tile_names(engine):
+    """The board as the list of lists of tile names it was stored as before the np.int8 grid"""
+    return [[TILE_NAMES[tile] for tile in row] for row in engine.grid.tolist()]
+
+
+def string_check_matches(grid):
+    """check_matches() as it was on a list-of-strings board, kept as the baseline for the numpy scan"""
+    height, width = len(grid), len(grid[0])
+    matches = []
+
+    # Check horizontal matches
+    for y in range(height):
+        x = 0
+        while x < width - 2:
+            current = grid[y][x]
+            if current is None or current in ['blocker', 'bomb']:
+                x += 1
+                continue
+            match_length = 1
+            while x + match_length < width and grid[y][x + match_length] == current:
+                if grid[y][x + match_length] in ['blocker', 'bomb']:
+                    break  # Stop match at blocker or bomb
+                match_length += 1
+            if match_length >= 3:
+                matches.append([(x + i, y) for i in range(match_length)])
+                x += match_length
+            else:
+                x += 1
+
+    # Check vertical matches
+    for x in range(width):
+        y = 0
+        while y < height - 2:
+            current = grid[y][x]
+            if current is None or current in ['blocker', 'bomb']:
+                y += 1
+                continue
+            match_length = 1
+            while y + match_length < height and grid[y + match_length][x] == current:
+                if grid[y + match_length][x] in ['blocker', 'bomb']:
+                    break  # Stop match at blocker or bomb
+                match_length += 1
+            if match_length >= 3:
+                matches.append([(x, y + i) for i in range(match_length)])
+                y += match_length
+            else:
+                y += 1
+
+    return matches
+
+
+def engine_benchmarks(size, blockers, bombs):
+    tag = f"size={size}/blockers={blockers}/bombs={bombs}"
+    settled = make_board(size, blockers, bombs)
+    scrambled = scramble(settled)
+
+    def with_holes():
+        engine = scrambled.copy()
+        engine.remove_matches(engine.check_matches())
+        return engine
+
+    def after_swap():
+        engine = settled.copy()
+        engine.swap_tiles(*engine.legal_moves()[0])
+        return engine
+
+    def full_move(engine):
+        return engine.apply_move(*engine.legal_moves()[0])
+
+    def high_level():
+        engine = settled.copy()
+        engine.level = 20
+        return engine
+
+    return [
+        Benchmark(f"check_matches/{tag}", scrambled.copy, GameEngine.check_matches),
+        Benchmark(f"check_matches_settled/{tag}", settled.copy, GameEngine.check_matches),
+        Benchmark(f"check_matches_strings/{tag}", lambda: tile_names(scrambled), string_check_matches),
+        Benchmark(f"check_matches_settled_strings/{tag}", lambda: tile_names(settled), string_check_matches),
+        Benchmark(f"check_dirty_matches/{tag}", after_swap, GameEngine.check_dirty_matches),
+        Benchmark(f"remove_matches/{tag}", lambda: (scrambled.copy(), scrambled.check_matches()),
+                  lambda args: args[0].remove_matches(args[1])),
+        Benchmark(f"fill_empty_spaces/{tag}", with_holes, GameEngine.fill_empty_spaces),
+        Benchmark(f"ensure_no_matches_at_start/{tag}", scrambled.copy, GameEngine.ensure_no_matches_at_start),
+        Benchmark(f"reset_grid/level=20/{tag}", high_level, GameEngine.reset_grid),
+        Benchmark(f"legal_moves/{tag}", scrambled.copy, GameEngine.legal_moves),
+        Benchmark(f"resolve_cascade/{tag}", lambda: (scrambled.copy(), scrambled.check_matches()),
+                  lambda args: args[0].resolve_cascade(args[1])),
+        Benchmark(f"apply_move/{tag}", settled.copy, full_move),
+    ]
+
+
+def bitboard_benchmarks():
+    settled = make_board(8, 0.05, 0.02, backend='bitboard')
+    scrambled = scramble(settled)
+    tag = "size=8/blockers=0.05/bombs=0.02/backend=bitboard"
+    return [
+        Benchmark(f"check_matches/{tag}", scrambled.copy, lambda engine: engine.check_matches()),
+        Benchmark(f"legal_moves/{tag}", scrambled.copy, lambda engine: engine.legal_moves()),
+        Benchmark(f"apply_move/{tag}", settled.copy, lambda engine: engine.apply_move(*engine.legal_moves()[0])),
+    ]
+
+
+def render_benchmarks(size):
+    """Headless frames of BoardRenderer: a full redraw and a frame where a few cells changed"""
+    import pygame
+    from Assets import build_atlas, IMAGE_DIR
+    from GameEngine import TILE_NAMES
+    from Renderer import BoardRenderer
+
+    tile_size = max(4, RENDER_WIDTH // size)
+    pygame.display.init()
+    screen = pygame.display.set_mode((size * tile_size, size * tile_size + 50))
+    atlas, regions = build_atlas(tile_size, IMAGE_DIR)
+    atlas = atlas.convert_alpha()
+    tile_images = [atlas.subsurface(regions[name]) if name in regions else None for name in TILE_NAMES]
+    renderer = BoardRenderer(screen, tile_images, (size, size), tile_size, 50, (255, 255, 255))
+    board = make_board(size, 0.05, 0.02)
+    rng = np.random.default_rng(SEED)
+    tag = f"size={size}"
+
+    def draw(grid):
+        renderer.draw_board(grid)
+        renderer.present()
+
+    def full_frame():
+        renderer.invalidate()
+        return board.grid
+
+    def incremental_frame():
+        draw(board.grid)  # bring the renderer up to date, then change a few cells
+        grid = board.grid.copy()
+        ys, xs = rng.integers(size, size=(2, 6))
+        grid[ys, xs] = np.where(grid[ys, xs] == EMPTY, IS_CANDY.nonzero()[0][0], EMPTY)
+        return grid
+
+    def idle_frame():
+        draw(board.grid)
+        return board.grid
+
+    return [
+        Benchmark(f"frame_full/{tag}", full_frame, draw),
+        Benchmark(f"frame_incremental/{tag}", incremental_frame, draw),
+        Benchmark(f"frame_idle/{tag}", idle_frame, draw),
+    ]
+
+
+def game_frame_benchmarks():
+    """A whole GameState.draw_all() frame of the real game, HUD included, and a swap with fast animations"""
+    import Game
+    from Replay import ReplayLog
+
+    Game.init_display()
+    state = Game.GameState(seed=SEED)
+    fast = Game.GameState(seed=SEED, fast_animations=True)
+
+    def full_frame():
+        state.invalidate()
+        return state
+
+    def fast_move():
+        # Copies share the replay log, so each one gets its own rather than
+        # all runs appending their swaps to one growing list
+        game = fast.copy()
+        game.replay_log = ReplayLog(game.seed, game.replay_log.board_size, game.replay_log.ai_model)
+        return game, fast.hint()
+
+    return [
+        Benchmark("game_frame_full/size=8", full_frame, lambda state: state.draw_all(Game.screen)),
+        Benchmark("game_frame_idle/size=8", lambda: state, lambda state: state.draw_all(Game.screen)),
+        Benchmark("game_move_fast/size=8", fast_move, lambda args: args[0].handle_swap(*args[1])),
+    ]
+
+
+def all_benchmarks(sizes):
+    """Benchmarks are built lazily per group, so --filter doesn't pay for setting up the others"""
+    for size in sizes:
+        for blockers, bombs in DENSITIES:
+            yield lambda size=size, blockers=blockers, bombs=bombs: engine_benchmarks(size, blockers, bombs)
+    if 8 in sizes:
+        yield bitboard_benchmarks
+        yield game_frame_benchmarks
+    for size in sizes:
+        yield lambda size=size: render_benchmarks(size)
+
+
+def random_legal_move(engine, rng):
+    """A random swap that creates a match, or None on a dead board"""
+    engine.refresh_legal_moves()
+    east, south = np.flatnonzero(engine.legal_east), np.flatnonzero(engine.legal_south)
+    if not len(east) + len(south):
+        return None
+    i = int(rng.integers(len(east) + len(south)))
+    width = engine.grid.shape[1]
+    if i < len(east):
+        y, x = divmod(int(east[i]), width)
+        return (x, y), (x + 1, y)
+    y, x = divmod(int(south[i - len(east)]), width)
+    return (x, y), (x, y + 1)
+
+
+def parse_board_sizes(text):
+    """'64x64,256x32' -> ((64, 64), (256, 32)); a single number is a square board"""
+    sizes = []
+    for part in text.split(','):
+        width, _, height = part.lower().partition('x')
+        sizes.append((int(width), int(height or width)))
+    return tuple(sizes)
+
+
+def stress(sizes=STRESS_SIZES, moves=100, game_moves=20):
+    """Play random moves on each board size and report throughput and frame times
+
+    Engine moves/s is apply_move() alone. Game moves/s plays the moves in a
+    headless GameState with every animation, drawing a frame per logic step,
+    so it counts wall time rather than game time.
+    """
+    import Game
+    from FrameProfiler import PhaseTimer
+
+    Game.init_display()
+    print(f"{'board':>9}{'cells':>8}{'engine moves/s':>16}{'game moves/s':>14}"
+          f"{'frame p50':>11}{'p95':>8}{'p99':>8}  ms")
+    report = {}
+    for width, height in sizes:
+        rng = np.random.default_rng(SEED)
+        engine = new_engine('numpy', SEED, (width, height))
+        played = 0
+        start = time.perf_counter()
+        while played < moves:
+            move = random_legal_move(engine, rng)
+            if move is None:
+                break
+            engine.apply_move(*move)
+            played += 1
+        engine_rate = played / (time.perf_counter() - start)
+
+        state = Game.GameState(seed=SEED, size=(width, height))
+        # Keep the game going: no move limit, timer or level change
+        state.moves_remaining = state.level_time_limit = state.target_score = 10 ** 9
+        frames = PhaseTimer(window=1 << 20)
+        state.draw_all(Game.screen)
+        played = 0
+        start = time.perf_counter()
+        while played < game_moves or state.animating:
+            frame_start = time.perf_counter_ns()
+            if not state.animating and played < game_moves:
+                move = random_legal_move(state, rng)
+                if move is None:
+                    break
+                state.handle_swap(*move)
+                played += 1
+            state.update(Game.LOGIC_STEP)
+            state.draw_all(Game.screen)
+            frames.add((time.perf_counter_ns() - frame_start) / 1e6)
+        game_rate = played / (time.perf_counter() - start)
+
+        p50, p95, p99 = frames.percentiles().tolist()
+        report[f"{width}x{height}"] = {'engine_moves_per_s': engine_rate, 'game_moves_per_s': game_rate,
+                                       'frames': frames.count, 'frame_p50_ms': p50, 'frame_p95_ms': p95,
+                                       'frame_p99_ms': p99, 'frame_max_ms': frames.worst}
+        print(f"{width:>4}x{height:<4}{width * height:>8}{engine_rate:>16.0f}{game_rate:>14.1f}"
+              f"{p50:>11.2f}{p95:>8.2f}{p99:>8.2f}")
+    return report
+
+
+def measure(benchmark, repeat, min_time):
+    """Median and minimum time of one run in microseconds
+
+    Runs at least `repeat` times and until `min_time` seconds of timed work
+    have been collected. Setup is excluded from the timings.
+    """
+    benchmark.run(benchmark.setup())  # warm-up
+    times = []
+    while len(times) < repeat or sum(times) < min_time * 1e9:
+        data = benchmark.setup()
+        start = time.perf_counter_ns()
+        benchmark.run(data)
+        times.append(time.perf_counter_ns() - start)
+        if len(times) >= 100 * repeat:
+            break
+    times = np.array(times) / 1000
+    return {'median_us': float(np.median(times)), 'min_us': float(times.min()), 'runs': len(times)}
+
+
+def run(sizes=SIZES, pattern=None, repeat=20, min_time=0.2, report=print):
+    results = {}
+    for group in all_benchmarks(sizes):
+        for benchmark in group():
+            if pattern and pattern not in benchmark.name:
+                continue
+            results[benchmark.name] = measure(benchmark, repeat, min_time)
+            if report:
+                report(f"{benchmark.name:<60}{results[benchmark.name]['median_us']:>12.1f} us")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of the benchmarks whose median got slower than the baseline by more than `threshold` (a fraction)"""
+    regressions = []
+    print(f"\n{'benchmark':<60}{'baseline':>12}{'now':>12}{'change':>9}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, now = baseline[name]['median_us'], result['median_us']
+        change = now / before - 1 if before else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<60}{before:>12.1f}{now:>12.1f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine and renderer hot paths")
+    parser.add_argument('--sizes', type=lambda text: tuple(int(s) for s in text.split(',')), default=SIZES,
+                        help="board sizes, e.g. 8,16 (default %(default)s)")
+    parser.add_argument('--filter', metavar='TEXT', help="only run benchmarks whose name contains TEXT")
+    parser.add_argument('--repeat', type=int, default=20, help="minimum timed runs per benchmark (default 20)")
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help="minimum seconds of timed runs per benchmark (default 0.2)")
+    parser.add_argument('--quick', action='store_true', help="fewer runs, for a smoke test")
+    parser.add_argument('--save', metavar='PATH', help="write the results as JSON")
+    parser.add_argument('--baseline', metavar='PATH', help="compare against results saved with --save")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed slowdown against the baseline as a fraction (default 0.10)")
+    parser.add_argument('--stress', action='store_true',
+                        help="play games on growing boards and report moves/s and frame times instead")
+    parser.add_argument('--stress-sizes', metavar='WxH,...',
+                        type=parse_board_sizes,
+                        default=STRESS_SIZES, help="board sizes for --stress")
+    args = parser.parse_args(argv)
+    if args.stress:
+        report = stress(args.stress_sizes, 20 if args.quick else 100, 5 if args.quick else 20)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'stress': report}, f, indent=2)
+        return 0
+    if args.quick:
+        args.repeat, args.min_time = 3, 0.0
+
+    results = run(args.sizes, args.filter, args.repeat, args.min_time)
+
+    if args.save:
+        meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                'processor': platform.processor(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
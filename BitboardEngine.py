@@ -0,0 +1,171 @@
+import numpy as np
+
+from GameEngine import GameEngine, merge_runs, EMPTY, CANDY_TILES, BLOCKER, BOMB, TILE_NAMES
+
+# Bit y * 8 + x of a bitboard is the cell (x, y) of an 8x8 board
+BOARD_SIZE = 8
+FULL = (1 << 64) - 1
+COLUMN_A = 0x0101010101010101  # cells with x == 0
+COLUMN_H = COLUMN_A << 7  # cells with x == 7
+RUN_STARTS = FULL & ~(COLUMN_A << 6) & ~COLUMN_H  # cells with x <= 5 can start a horizontal run of 3
+
+TILE_CODES = np.arange(len(TILE_NAMES), dtype=np.int8).reshape(-1, 1)
+NO_BOMBS = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+
+
+# Move every cell of a bitboard one step in a direction, dropping cells that fall off the board
+def east(bits):
+    return (bits << 1) & ~COLUMN_A & FULL
+
+
+def west(bits):
+    return (bits >> 1) & ~COLUMN_H
+
+
+def south(bits):
+    return (bits << 8) & FULL
+
+
+def north(bits):
+    return bits >> 8
+
+
+def bit_indices(bits):
+    """Indices of the set bits, lowest first"""
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+
+class BitboardEngine(GameEngine):
+    """GameEngine for the 8x8 board that evaluates matches, bombs and legal moves on 64-bit bitboards
+
+    The np.int8 grid stays the source of truth; bitboards are built from it in
+    one vectorized pass whenever a query needs them, so every other rule is
+    inherited unchanged and results are identical to GameEngine.
+    """
+
+    def __init__(self, seed=None, size=BOARD_SIZE):
+        self.pairs_east = self.pairs_south = 0  # legal_east / legal_south as bitboards
+        super().__init__(seed, size)
+        if self.grid.shape != (BOARD_SIZE, BOARD_SIZE):
+            raise ValueError(f"BitboardEngine needs a {BOARD_SIZE}x{BOARD_SIZE} board, got {self.grid.shape}")
+
+    def bitboards(self):
+        """One bitboard per tile code (indexed by code)"""
+        cells = self.grid.reshape(1, BOARD_SIZE * BOARD_SIZE) == TILE_CODES
+        return np.packbits(cells, axis=1, bitorder='little').view('<u8')[:, 0].tolist()
+
+    def check_matches(self):
+        """Check for all matches on the board, ignoring blockers and bombs"""
+        boards = self.bitboards()
+        horizontal = 0
+        vertical = 0
+        for candy in CANDY_TILES:
+            bits = boards[candy]
+            horizontal |= bits & (bits >> 1) & (bits >> 2) & RUN_STARTS
+            vertical |= bits & (bits >> 8) & (bits >> 16)
+        if not (horizontal or vertical):
+            return []
+
+        matches = []
+
+        # Check horizontal matches
+        for start, length in merge_runs(bit_indices(horizontal), 1):
+            y, x = divmod(start, BOARD_SIZE)
+            matches.append([(x + i, y) for i in range(length)])
+
+        # Check vertical matches (column by column)
+        starts = sorted(bit_indices(vertical), key=lambda i: (i % BOARD_SIZE, i))
+        for start, length in merge_runs(starts, BOARD_SIZE):
+            y, x = divmod(start, BOARD_SIZE)
+            matches.append([(x, y + i) for i in range(length)])
+
+        return matches
+
+    def check_bomb_adjacent(self, matches):
+        """Check if any matches are adjacent to bombs and deduct points
+
+        Returns the (xs, ys) arrays of the bombs that went off.
+        """
+        matched = 0
+        for match in matches:
+            for x, y in match:
+                matched |= 1 << (y * BOARD_SIZE + x)
+
+        bombs = (east(matched) | west(matched) | south(matched) | north(matched)) & self.bitboards()[BOMB]
+        if not bombs:
+            return NO_BOMBS
+
+        indices = bit_indices(bombs)
+        self.score = max(0, self.score - 30 * len(indices))  # Deduct 30 points per bomb, don't go below 0
+        self.total_score = max(0, self.total_score - 30 * len(indices))
+        # Remove the bombs
+        for i in indices:
+            y, x = divmod(i, BOARD_SIZE)
+            self.grid[y, x] = EMPTY
+            self.gap_columns[x] = True
+            self.bomb_positions.discard((x, y))
+        ys, xs = np.divmod(np.array(indices, dtype=np.intp), BOARD_SIZE)
+        return xs, ys
+
+    def refresh_legal_moves(self):
+        """Rebuild the legal-move index from bitboards if anything changed since the last refresh
+
+        For every candy colour this finds the cells a candy of that colour
+        could move into (from each direction) and complete a run of 3 with
+        cells other than the one it came from. The whole board costs less
+        than slicing out the changed area, so there is no partial refresh.
+        """
+        if not self.legal_stale.any():
+            return
+        self.legal_stale[...] = False
+
+        boards = self.bitboards()
+        into_from_east = into_from_west = into_from_south = into_from_north = 0
+        for candy in CANDY_TILES:
+            bits = boards[candy]
+            left1 = east(bits)  # cell to the left has this colour
+            left2 = east(left1)
+            right1 = west(bits)
+            right2 = west(right1)
+            up1 = south(bits)
+            up2 = south(up1)
+            down1 = north(bits)
+            down2 = north(down1)
+            horizontal = (left1 & left2) | (left1 & right1) | (right1 & right2)
+            vertical = (up1 & up2) | (up1 & down1) | (down1 & down2)
+
+            into_from_east |= right1 & ((left1 & left2) | vertical)
+            into_from_west |= left1 & ((right1 & right2) | vertical)
+            into_from_south |= down1 & ((up1 & up2) | horizontal)
+            into_from_north |= up1 & ((down1 & down2) | horizontal)
+
+        # Blockers can't be swapped
+        open_cells = ~boards[BLOCKER] & FULL
+        # A pair starting at p is legal if either tile completes a run at the other end
+        self.pairs_east = (into_from_east & open_cells) | west(into_from_west & open_cells)
+        self.pairs_south = (into_from_south & open_cells) | north(into_from_north & open_cells)
+
+        # Unpack into the arrays that is_legal_move(), has_legal_moves() and hint() read
+        pairs = np.array([self.pairs_east, self.pairs_south], dtype='<u8').view(np.uint8)
+        legal = np.unpackbits(pairs, bitorder='little').reshape(2, BOARD_SIZE, BOARD_SIZE)
+        self.legal_east[...] = legal[0]
+        self.legal_south[...] = legal[1]
+
+    def legal_moves(self):
+        """All swaps that would create a match, as ((x1, y1), (x2, y2)) pairs in row-major order"""
+        self.refresh_legal_moves()
+        pairs_east, pairs_south = self.pairs_east, self.pairs_south
+        moves = []
+        for i in bit_indices(pairs_east | pairs_south):
+            y, x = divmod(i, BOARD_SIZE)
+            bit = 1 << i
+            if pairs_east & bit:
+                moves.append(((x, y), (x + 1, y)))
+            if pairs_south & bit:
+                moves.append(((x, y), (x, y + 1)))
+        return moves
@@ -0,0 +1,161 @@
+"""Per-phase timing of the main loop
+
+Wrap a phase in `with profiler.phase('name'):`. While the profiler is
+enabled each phase keeps a rolling window of its most recent durations,
+from which p50/p95/p99 are shown in an on-screen overlay and written out
+by dump(). While it is disabled phase() hands back one shared no-op
+context manager, so instrumented code costs a method call per phase.
+"""
+import json
+import time
+import platform
+
+import numpy as np
+import pygame
+
+PROFILE_FILE = "frame_profile.json"
+PROFILE_WINDOW = 600  # samples kept per phase (10 s of frames at 60 FPS)
+OVERLAY_REFRESH = 0.5  # seconds between overlay rebuilds
+PERCENTILES = (50, 95, 99)
+
+
+class NullPhase:
+    """Context manager that does nothing, used while the profiler is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+class PhaseTimer:
+    """Rolling window of one phase's durations in ms"""
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.samples = np.zeros(window)
+        self.count = 0  # samples ever recorded
+        self.total = 0.0
+        self.worst = 0.0
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.add((time.perf_counter_ns() - self.start) / 1e6)
+        return False
+
+    def add(self, ms):
+        self.samples[self.count % len(self.samples)] = ms
+        self.count += 1
+        self.total += ms
+        self.worst = max(self.worst, ms)
+
+    def window(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+    def percentiles(self):
+        return np.percentile(self.window(), PERCENTILES)
+
+    def summary(self):
+        p50, p95, p99 = self.percentiles().tolist()
+        return {'count': self.count, 'mean_ms': self.total / self.count, 'max_ms': self.worst,
+                'window': len(self.window()), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+
+class FrameProfiler:
+    """Phase timers for the main loop, an overlay showing them and a JSON dump
+
+    `recording` keeps the profiler on for the whole session (--profile);
+    otherwise it only runs while the overlay is shown. Percentiles are
+    per occurrence of a phase, so phases that don't run every frame (the
+    HUD, a cascade) aren't diluted by frames where they were skipped.
+    """
+
+    def __init__(self, recording=False, window=PROFILE_WINDOW):
+        self.recording = recording
+        self.window = window
+        self.overlay_visible = False
+        self.enabled = recording
+        self.timers = {}
+        self.overlay_surface = None
+        self.overlay_built = 0.0
+        self.frame_start = 0
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(self.window)
+        return timer
+
+    def next_frame(self):
+        """Call once per main-loop iteration; the time between calls is recorded as the 'frame' phase"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        if self.frame_start:
+            self.phase('frame').add((now - self.frame_start) / 1e6)
+        self.frame_start = now
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.enabled = self.recording or self.overlay_visible
+        self.overlay_surface = None
+        self.frame_start = 0
+
+    def summary(self):
+        return {name: timer.summary() for name, timer in self.timers.items() if timer.count}
+
+    def overlay(self, font):
+        """Surface listing p50/p95/p99 of every phase, or None while the overlay is hidden
+
+        It is rebuilt at most every OVERLAY_REFRESH seconds; in between the
+        same surface is returned, so an unchanged frame stays unchanged.
+        """
+        if not self.overlay_visible:
+            return None
+        now = time.perf_counter()
+        if self.overlay_surface is not None and now - self.overlay_built < OVERLAY_REFRESH:
+            return self.overlay_surface
+        self.overlay_built = now
+
+        rows = [('phase (ms)', 'p50', 'p95', 'p99')]
+        for name, stats in self.summary().items():
+            rows.append((name,) + tuple(f"{stats[key]:.2f}" for key in ('p50_ms', 'p95_ms', 'p99_ms')))
+        # Cells are rendered one by one and right-aligned per column, so any font lines up
+        cells = [[font.render(text, True, (255, 255, 255)) for text in row] for row in rows]
+        widths = [max(cell.get_width() for cell in column) + 10 for column in zip(*cells)]
+
+        line_height = font.get_linesize()
+        surface = pygame.Surface((sum(widths) + 2, line_height * len(rows) + 8), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 180))
+        for i, row in enumerate(cells):
+            x = 6
+            for j, (cell, width) in enumerate(zip(row, widths)):
+                offset = 0 if j == 0 else width - 10 - cell.get_width()
+                surface.blit(cell, (x + offset, 4 + i * line_height))
+                x += width
+        self.overlay_surface = surface
+        return surface
+
+    def dump(self, path=PROFILE_FILE):
+        """Write the summary of every phase as JSON; does nothing if nothing was recorded"""
+        summary = self.summary()
+        if not summary:
+            return None
+        meta = {'python': platform.python_version(), 'pygame': pygame.version.ver,
+                'window': self.window, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        try:
+            with open(path, 'w') as f:
+                json.dump({'meta': meta, 'phases': summary}, f, indent=2)
+        except OSError as e:
+            print(f"Error saving frame profile: {e}")
+            return None
+        return path
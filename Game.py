@@ -1,70 +1,148 @@
-import pygame
-import random
 import os
-import json
-from transformers import pipeline
+import sys
+import time
+import secrets
+from contextlib import contextmanager
+from functools import lru_cache
 
-from AIModule import AIModule
+STARTUP_REPORT = '--startup-report' in sys.argv
+PROFILE_FRAMES = '--profile' in sys.argv  # record frame phase timings for the whole session
+FAST_ANIMATIONS = '--fast-animations' in sys.argv  # start with fast animations on (toggled with F)
+startup_phases = []
 
-# Initialize Pygame
-pygame.init()
+
+def current_rss_mb():
+    """Resident set size of this process in MB (0.0 if the platform can't tell us)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes everywhere else
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return 0.0
+
+
+@contextmanager
+def startup_phase(name):
+    """Time one init phase for the --startup-report output"""
+    start = time.perf_counter()
+    yield
+    if STARTUP_REPORT:
+        startup_phases.append((name, (time.perf_counter() - start) * 1000, current_rss_mb()))
+
+
+def print_startup_report():
+    print("Startup report")
+    print(f"{'phase':<24}{'time (ms)':>12}{'RSS (MB)':>12}")
+    for name, elapsed_ms, rss in startup_phases:
+        print(f"{name:<24}{elapsed_ms:>12.1f}{rss:>12.1f}")
+    total = sum(elapsed_ms for _, elapsed_ms, _ in startup_phases)
+    print(f"{'total':<24}{total:>12.1f}{current_rss_mb():>12.1f}")
+
+
+with startup_phase('import modules'):
+    import numpy as np
+    import pygame
+
+    from AIModule import AIModule
+    from Animation import AnimationQueue, FallingTiles
+    from Assets import load_sprites, load_fonts
+    from FrameProfiler import FrameProfiler
+    from ProfileStore import ProfileStore, PROFILE_DB
+    from Replay import ReplayLog, replay_path
+    from GameEngine import GameEngine, GRID_SIZE, EMPTY, BLOCKER, TILE_NAMES, board_shape
+    from Renderer import BoardRenderer, render_text
 
 # Screen dimensions
 WIDTH, HEIGHT = 600, 650
-GRID_SIZE = 8
-TILE_SIZE = WIDTH // GRID_SIZE
+HUD_HEIGHT = 50  # the board is drawn below the HUD strip
+TILE_SIZE = WIDTH // GRID_SIZE  # of the default board; larger boards get smaller tiles
+MIN_TILE_SIZE = 24  # boards that don't fit at this size scroll (arrow keys / mouse wheel)
 LEVEL_TRANSITION_DELAY = 1500  # 1.5 seconds
 
-# Initialize screen FIRST (before loading images)
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Candy Crush Clone")
+# Game logic runs in fixed steps of game time, independent of the render frame rate
+FPS = 60
+LOGIC_STEP = 1000 / 60  # ms of game time per logic update
+MAX_LOGIC_STEPS = 5  # per rendered frame; any backlog beyond that is dropped so a slow frame can't snowball
+NO_CELLS = (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))  # empty (xs, ys) of hidden cells
+SCROLL_KEYS = {pygame.K_LEFT: (-1, 0), pygame.K_RIGHT: (1, 0), pygame.K_UP: (0, -1), pygame.K_DOWN: (0, 1)}
+
+# Animation timing
+SWAP_DURATION = 150  # ms
+CLEAR_DURATION = 120  # ms
+FALL_SPEED = 0.6  # pixels per ms
 
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 GRAY = (200, 200, 200)
 RED = (255, 0, 0)
+GOLD = (255, 215, 0)
 
-# Font initialization (after screen is created)
-font = pygame.font.Font(None, 32)
-large_font = pygame.font.Font(None, 68)
+SAVE_FILE = "sava_data.json"  # old single-player save, imported into PROFILE_DB on startup
 
-SAVE_FILE = "sava_data.json"
+# Display resources, created by main() so that importing this module has no side effects
+screen = None
+FONTS = {}  # fonts resolved once at startup by Assets.load_fonts()
+font = None
+large_font = None
+clock = None
+IMAGESDICT = {}
+profiler = FrameProfiler(recording=PROFILE_FRAMES)  # F3 shows its overlay
+profiles = None
 player_data = None
 
 
-def load_player_data():
-    if os.path.exists(SAVE_FILE):
-        with open(SAVE_FILE, 'r') as f:
-            return json.load(f)
-    return None
+def open_profiles():
+    """Open the profile store, importing an old sava_data.json if there is one"""
+    store = ProfileStore(PROFILE_DB)
+    store.migrate_json(SAVE_FILE)
+    return store
+
 
+def shutdown(game_state=None):
+    """Leave the game from any screen: save the replay and frame profile, then close everything"""
+    if game_state is not None:
+        game_state.save_replay()
+    profile_path = profiler.dump()
+    if profile_path:
+        print(f"Frame profile written to {profile_path}")
+    pygame.quit()
+    if profiles is not None:
+        profiles.close()
+    sys.exit()
 
-def save_player_data(name, highscore):
-    with open(SAVE_FILE, 'w') as f:
-        json.dump({'name': name, 'highscore': highscore}, f)
+
+def ai_model_path(name):
+    """Per-player AI model file, stored next to PROFILE_DB"""
+    safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name) or 'player'
+    return os.path.join(os.path.dirname(PROFILE_DB), f"ai_model_{safe_name}.bin")
 
 
 def get_name_input(screen, font):
     name = ""
     active = True
-    input_font = pygame.font.Font(None, 48)
+    input_font = FONTS['input']
     input_box = pygame.Rect(WIDTH // 2 - 150, 270, 300, 50)
 
     while active:
         screen.fill(WHITE)
-        prompt = font.render("Enter your name:", True, BLACK)
+        prompt = render_text(font, "Enter your name:", BLACK)
         pygame.draw.rect(screen, (230, 230, 230), input_box)  # background
         pygame.draw.rect(screen, BLACK, input_box, 2)  # border
-        text_surface = input_font.render(name, True, BLACK)
+        text_surface = render_text(input_font, name, BLACK)
         screen.blit(prompt, (WIDTH // 2 - prompt.get_width() // 2, 200))
         screen.blit(text_surface, (input_box.x + 10, input_box.y + 10))
         pygame.display.flip()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+                shutdown()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN and name.strip():
                     return name.strip()
@@ -75,478 +153,391 @@ def get_name_input(screen, font):
 
 
 def show_opening_screen(screen, font, player_data):
+    """Show the title screen until a key is pressed; returns True if N (new player) was pressed"""
     screen.fill(WHITE)
-    try:
-        title_img = pygame.image.load("images/Candy Crush Clone.png")
-        title_img = pygame.transform.scale(title_img, (500, 300))
-        screen.blit(title_img, (WIDTH // 2 - 250, 80))
-    except:
-        fallback = font.render("Candy Crush Clone", True, BLACK)
+    if 'title' in IMAGESDICT:
+        screen.blit(IMAGESDICT['title'], (WIDTH // 2 - 250, 80))
+    else:
+        fallback = render_text(font, "Candy Crush Clone", BLACK)
         screen.blit(fallback, (WIDTH // 2 - fallback.get_width() // 2, 100))
 
     if player_data:
-        welcome = font.render(f"Welcome, {player_data['name']}!", True, BLACK)
-        highscore = font.render(f"Highscore: {player_data['highscore']}", True, BLACK)
+        welcome = render_text(font, f"Welcome, {player_data['name']}!", BLACK)
+        highscore = render_text(font, f"Highscore: {player_data['highscore']}", BLACK)
         screen.blit(welcome, (WIDTH // 2 - welcome.get_width() // 2, 330))
         screen.blit(highscore, (WIDTH // 2 - highscore.get_width() // 2, 360))
-        prompt = font.render("Press any key to start", True, BLACK)
+        prompt = render_text(font, "Press any key to start", BLACK)
         screen.blit(prompt, (WIDTH // 2 - prompt.get_width() // 2, 420))
+        switch = render_text(font, "Press N to play as someone else", BLACK)
+        screen.blit(switch, (WIDTH // 2 - switch.get_width() // 2, 460))
     else:
-        prompt = font.render("Press any key to begin", True, BLACK)
+        prompt = render_text(font, "Press any key to begin", BLACK)
         screen.blit(prompt, (WIDTH // 2 - prompt.get_width() // 2, 420))
 
     pygame.display.flip()
 
-    waiting = True
-    while waiting:
+    while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+                shutdown()
             elif event.type == pygame.KEYDOWN:
-                waiting = False
+                return event.key == pygame.K_n
 
 
-# Load player data and show intro screen
-player_data = load_player_data()
-show_opening_screen(screen, font, player_data)
+def load_images():
+    """Load the tile and title images, scaled to TILE_SIZE, from the cached sprite atlas"""
+    return load_sprites(TILE_SIZE)
 
-if not player_data:
-    name = get_name_input(screen, font)
-    player_data = {'name': name, 'highscore': 0}
-    save_player_data(name, 0)
 
-# Now load images (with proper error handling)
-IMAGESDICT = {}
-candy_colors = ['blue', 'green', 'orange', 'purple', 'red', 'yellow']
+def tile_size_for(shape):
+    """Tile size that fits a (height, width) board below the HUD, but at least MIN_TILE_SIZE"""
+    height, width = shape
+    return max(MIN_TILE_SIZE, min(WIDTH // width, (HEIGHT - HUD_HEIGHT) // height))
 
-try:
-    # Try to load actual images
-    for color in candy_colors:
-        try:
-            IMAGESDICT[f'{color} candy'] = pygame.image.load(f"images/{color}-candy.png").convert_alpha()
-        except:
-            # If specific image fails, create a colored rectangle
-            surf = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-            if color == 'blue':
-                pygame.draw.rect(surf, (0, 0, 255), (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 10)
-            elif color == 'green':
-                pygame.draw.rect(surf, (0, 255, 0), (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 10)
-            elif color == 'orange':
-                pygame.draw.rect(surf, (255, 165, 0), (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 10)
-            elif color == 'purple':
-                pygame.draw.rect(surf, (128, 0, 128), (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 10)
-            elif color == 'red':
-                pygame.draw.rect(surf, (255, 0, 0), (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 10)
-            elif color == 'yellow':
-                pygame.draw.rect(surf, (255, 255, 0), (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 10)
-            IMAGESDICT[f'{color} candy'] = surf
-        try:
-            IMAGESDICT['blocker'] = pygame.image.load("images/rock.png").convert_alpha()
-        except:
-            surf = pygame.Surface((TILE_SIZE, TILE_SIZE))
-            surf.fill((100, 100, 100))  # Gray color
-            pygame.draw.rect(surf, (50, 50, 50), (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 8)
-            IMAGESDICT['blocker'] = surf
 
-    try:
-        IMAGESDICT['bomb'] = pygame.image.load("images/bomb.png").convert_alpha()
-    except:
-        surf = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-        pygame.draw.circle(surf, (0, 0, 0), (TILE_SIZE // 2, TILE_SIZE // 2), TILE_SIZE // 2 - 5)
-        pygame.draw.circle(surf, (255, 0, 0), (TILE_SIZE // 2, TILE_SIZE // 2), TILE_SIZE // 2 - 10)
-        pygame.draw.rect(surf, (200, 200, 0), (TILE_SIZE // 2, 5, TILE_SIZE // 4, 5))
-        IMAGESDICT['bomb'] = surf
-
-except Exception as e:
-    print(f"Error loading images: {e}")
-    # Fallback: create all colored rectangles
-    IMAGESDICT = {}
-    colors = [
-        ('blue candy', (0, 0, 255)),
-        ('green candy', (0, 255, 0)),
-        ('orange candy', (255, 165, 0)),
-        ('purple candy', (128, 0, 128)),
-        ('red candy', (255, 0, 0)),
-        ('yellow candy', (255, 255, 0)),
-        ('bomb', (0, 0, 0))
-    ]
-    for name, color in colors:
-        surf = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-        if name == 'bomb':
-            pygame.draw.circle(surf, color, (TILE_SIZE // 2, TILE_SIZE // 2), TILE_SIZE // 2 - 5)
-        else:
-            pygame.draw.rect(surf, color, (2, 2, TILE_SIZE - 4, TILE_SIZE - 4), 0, 10)
-        IMAGESDICT[name] = surf
+@lru_cache(maxsize=None)
+def tile_images(tile_size):
+    """Tile sprites at `tile_size`, indexed by tile code"""
+    sprites = IMAGESDICT if tile_size == TILE_SIZE else load_sprites(tile_size)
+    return [sprites.get(name) for name in TILE_NAMES]
 
-CANDY_TILES = [key for key in IMAGESDICT.keys() if key not in ['blocker', 'bomb']]
 
+def parse_board_size(text):
+    """'WxH' or a single side length -> (width, height)"""
+    width, _, height = text.lower().partition('x')
+    height, width = board_shape((int(width), int(height or width)))
+    return width, height
 
-# Game state class with all necessary methods
-class GameState:
-    def __init__(self):
-        self.grid = [[random.choice(CANDY_TILES) for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-        self.score = 0
-        self.level = 1
-        self.total_score = 0
-        self.target_score = 1000
-        self.move_limit = 20
-        self.moves_remaining = self.move_limit
-        self.falling_tiles = []
-        self.player_performance = []
-        self.selected_tile = None
-        self.animating = False
-        self.game_over = False
-        self.ensure_no_matches_at_start()
-        self.blocker_positions = set()
-        self.bomb_positions = set()
-        self.place_blockers_for_level()
-        self.place_bombs()
-        self.ai = AIModule()
-        self.level_start_time = pygame.time.get_ticks()
-        self.level_time_limit = 60  # Initial time limit (seconds)
-        self.time_remaining = self.level_time_limit
-        self.level_start_time = pygame.time.get_ticks()
-        self.bomb_spawn_timer = 0
-        self.bomb_spawn_interval = 10000
 
-    def place_blockers_for_level(self):
-        self.blocker_positions.clear()
-
-        if self.level < 2:
-            return  # No blockers on level 1
-
-        num_blockers = (self.level - 1) * 2
-
-        placed = 0
-        while placed < num_blockers:
-            x = random.randint(0, GRID_SIZE - 1)
-            y = random.randint(0, GRID_SIZE - 1)
-            # Only place if empty or candy, NOT if blocker or something else
-            if self.grid[y][x] != 'blocker' and self.grid[y][x] != 'bomb':
-                self.grid[y][x] = 'blocker'
-                self.blocker_positions.add((x, y))
-                placed += 1
-
-    def place_bombs(self):
-        """Place bombs randomly on the grid"""
-        self.bomb_positions.clear()
-
-        # Place 1 bomb for every 2 levels
-        num_bombs = max(1, self.level // 2)
-
-        placed = 0
-        while placed < num_bombs:
-            x = random.randint(0, GRID_SIZE - 1)
-            y = random.randint(0, GRID_SIZE - 1)
-            if self.grid[y][x] != 'blocker' and self.grid[y][x] != 'bomb':
-                self.grid[y][x] = 'bomb'
-                self.bomb_positions.add((x, y))
-                placed += 1
-
-    def ensure_no_matches_at_start(self):
-        """Ensure there are no matches when the game starts or level resets"""
-        while True:
-            matches = self.check_matches()
-            if not matches:
-                break
-            # Reshuffle the grid if there are matches at start
-            for y in range(GRID_SIZE):
-                for x in range(GRID_SIZE):
-                    if self.grid[y][x] != 'blocker' and self.grid[y][x] != 'bomb':
-                        self.grid[y][x] = random.choice(CANDY_TILES)  # Only candy tiles, no blockers or bombs
-
-    def check_matches(self):
-        """Check for all matches on the board, ignoring blockers and bombs"""
-        matches = []
-
-        # Check horizontal matches
-        for y in range(GRID_SIZE):
-            x = 0
-            while x < GRID_SIZE - 2:
-                current = self.grid[y][x]
-                if current is None or current in ['blocker', 'bomb']:
-                    x += 1
-                    continue
-                match_length = 1
-                while x + match_length < GRID_SIZE and self.grid[y][x + match_length] == current:
-                    if self.grid[y][x + match_length] in ['blocker', 'bomb']:
-                        break  # Stop match at blocker or bomb
-                    match_length += 1
-                if match_length >= 3:
-                    matches.append([(x + i, y) for i in range(match_length)])
-                    x += match_length
-                else:
-                    x += 1
-
-        # Check vertical matches
-        for x in range(GRID_SIZE):
-            y = 0
-            while y < GRID_SIZE - 2:
-                current = self.grid[y][x]
-                if current is None or current in ['blocker', 'bomb']:
-                    y += 1
-                    continue
-                match_length = 1
-                while y + match_length < GRID_SIZE and self.grid[y + match_length][x] == current:
-                    if self.grid[y + match_length][x] in ['blocker', 'bomb']:
-                        break  # Stop match at blocker or bomb
-                    match_length += 1
-                if match_length >= 3:
-                    matches.append([(x, y + i) for i in range(match_length)])
-                    y += match_length
-                else:
-                    y += 1
-
-        return matches
-
-    def check_bomb_adjacent(self, matches):
-        """Check if any matches are adjacent to bombs and deduct points"""
-        for match in matches:
-            for x, y in match:
-                # Check all adjacent positions
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < GRID_SIZE and 0 <= ny < GRID_SIZE:
-                        if self.grid[ny][nx] == 'bomb':
-                            self.score = max(0, self.score - 30)  # Deduct 30 points, don't go below 0
-                            self.total_score = max(0, self.total_score - 30)
-                            # Remove the bomb
-                            self.grid[ny][nx] = None
-                            self.bomb_positions.discard((nx, ny))
-                            break  # Only deduct once per bomb
-
-    def remove_matches(self, matches):
-        """Remove matched tiles and update score"""
-        if not matches:
-            return False
+@lru_cache(maxsize=None)
+def game_over_screen():
+    """Full-screen game over screen, rendered on first use"""
+    surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+    # Solid dark background with bright red text (guaranteed visibility)
+    surface.fill(BLACK)
+    game_over_text = render_text(FONTS['title'], "GAME OVER", (255, 0, 0))
+    restart_text = render_text(FONTS['prompt'], "Press R to restart - Q to quit", (255, 255, 255))
+    surface.blit(game_over_text, (WIDTH // 2 - game_over_text.get_width() // 2, HEIGHT // 2 - 50))
+    surface.blit(restart_text, (WIDTH // 2 - restart_text.get_width() // 2, HEIGHT // 2 + 50))
+    return surface
 
-        # First check for bombs adjacent to matches
-        self.check_bomb_adjacent(matches)
-
-        # Flatten the list of matches and remove duplicates
-        all_positions = set()
-        for match in matches:
-            for pos in match:
-                all_positions.add(pos)
-
-        # Score calculation (more points for longer matches)
-        for match in matches:
-            length = len(match)
-            if length == 3:
-                points = 50
-            elif length == 4:
-                points = 100
-            else:  # 5 or more
-                points = 150
-
-            self.score += points
-            self.total_score += points
-        for x, y in all_positions:
-            if self.grid[y][x] not in ['blocker', 'bomb']:
-                self.grid[y][x] = None
 
-        return True
+@lru_cache(maxsize=4)
+def level_complete_overlay(level):
+    """Translucent level complete overlay for `level`, drawn over the board"""
+    surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    surface.fill((0, 0, 0, 180))  # Semi-transparent
 
-    def handle_falling_tiles(self):
-        """Handle the animation of falling tiles"""
-        if not self.falling_tiles:
-            return False
+    # Text with outline for better visibility
+    # Main text (white with red outline)
+    title_text = render_text(FONTS['title'], f"LEVEL {level} COMPLETE!", WHITE)
+    title_outline = render_text(FONTS['title'], f"LEVEL {level} COMPLETE!", RED)
 
-        for tile in self.falling_tiles[:]:
-            tile["y"] += 10  # Falling speed
+    # Prompt text (yellow with dark outline)
+    prompt_text = render_text(FONTS['prompt'], "Press any key to continue", (255, 255, 0))
+    prompt_outline = render_text(FONTS['prompt'], "Press any key to continue", (50, 50, 50))
 
-            # Check if tile has reached its destination
-            if tile["y"] >= (tile["target_y"] * TILE_SIZE) + 50:
-                self.grid[tile["target_y"]][tile["x"]] = tile["type"]
-                self.falling_tiles.remove(tile)
+    title_pos = (WIDTH // 2 - title_text.get_width() // 2, HEIGHT // 2 - 80)
+    prompt_pos = (WIDTH // 2 - prompt_text.get_width() // 2, HEIGHT // 2 + 20)
 
-        return True
+    # Draw outlines (offset by 1 pixel), then the main text
+    surface.blit(title_outline, (title_pos[0] + 1, title_pos[1] + 1))
+    surface.blit(prompt_outline, (prompt_pos[0] + 1, prompt_pos[1] + 1))
+    surface.blit(title_text, title_pos)
+    surface.blit(prompt_text, prompt_pos)
 
-    def handle_swap(self, pos1, pos2, screen):
-        """Handle the complete swap logic with match checking"""
-        # First swap the tiles
-        self.swap_tiles(pos1, pos2)
+    # Decorative gold border
+    pygame.draw.rect(surface, GOLD, (WIDTH // 2 - 200, HEIGHT // 2 - 120, 400, 200), 3)
+    return surface
 
-        # Check if this created any matches
-        matches = self.check_matches()
 
-        if matches:
-            # If we have matches:
-            self.animating = True
-            self.animate_swap(pos1, pos2, screen)
-
-            # Process all matches and cascades
-            while True:
-                # Remove matches and get score
-                self.remove_matches(matches)
-
-                # Make candies fall
-                self.fill_empty_spaces()
-
-                # Wait for all candies to finish falling
-                while self.handle_falling_tiles():
-                    self.draw_all(screen)
-                    pygame.display.flip()
-                    clock.tick(60)
-
-                # Check for new matches from cascades
-                matches = self.check_matches()
-                if not matches:
-                    break
+# Game state class with all necessary methods
+class GameState(GameEngine):
+    """Pygame front end: draws and animates a GameEngine board"""
+
+    def __init__(self, ai=None, seed=None, size=None, fast_animations=False):
+        # Every game runs from an explicit seed so it can be replayed
+        self.seed = secrets.randbits(63) if seed is None else seed
+        super().__init__(self.seed, GRID_SIZE if size is None else size)
+        self.tile_size = tile_size_for(self.grid.shape)
+        self.renderer = None  # created on the first draw, so games can run without a display
+        height, width = self.grid.shape
+        self.falling = FallingTiles(height * width)  # a refill moves at most every cell
+        self.player_performance = []
+        self.selected_tile = None
+        self.hint_move = None
+        self.animations = AnimationQueue()
+        self.animation_hidden = NO_CELLS  # (xs, ys) of cells drawn by the running animation instead of the grid
+        self.animation_sprites = []  # (tile, x, y, size) drawn over the board
+        self.shown_grid = None  # board drawn while a resolved move is played back, else the grid
+        self.score_pending = 0  # points of the played-back move not shown yet
+        self.game_over = False
+        self.game_over_drawn = False
+        self.level_complete_pending = False  # set when a level was completed and its screen not yet shown
+        # The AI is passed on across restarts so it keeps what it learned
+        self.ai = ai if ai is not None else AIModule()
+        self.game_time = 0  # ms of simulated game time, advanced by update()
+        self.steps = 0  # logic steps run so far
+        self.level_time_limit = 60  # Initial time limit (seconds)
+        self.time_remaining = self.level_time_limit
+        self.level_start_time = self.game_time
+        self.bomb_spawn_timer = 0
+        self.bomb_spawn_interval = 10000
 
+        # A returning player's saved model tunes the difficulty from level 1
+        # (an untrained AI gives the base 20 moves / 60 seconds)
+        self.move_limit, self.level_time_limit = self.ai.calculate_difficulty(self.level)
+        self.moves_remaining = self.move_limit
+        self.time_remaining = self.level_time_limit
 
-        else:
-            # If no matches, swap back but still count the move
-            self.animate_swap(pos1, pos2, screen)  # Visual swap back
-            self.swap_tiles(pos1, pos2)  # Actually swap back in grid
-            self.animate_swap(pos2, pos1, screen)  # Visual return to original
+        height, width = self.grid.shape
+        self.replay_log = ReplayLog(self.seed, (width, height), self.ai.model_bytes())
+        self.replay_saved = False
+
+        # Fast animations resolve every swap with all its cascades in one logic
+        # step and show only the settled board. Switching takes effect at the
+        # start of the next logic step, where it is logged for replays.
+        self.fast_animations = fast_animations
+        self.fast_animations_pending = None
+        if fast_animations:
+            self.replay_log.record_fast_animations(0, True)
+
+    @property
+    def animating(self):
+        return self.animations.busy
+
+    def board_renderer(self):
+        if self.renderer is None:
+            self.renderer = BoardRenderer(screen, tile_images(self.tile_size), self.grid.shape, self.tile_size,
+                                          HUD_HEIGHT, WHITE, (WIDTH, HEIGHT - HUD_HEIGHT))
+        return self.renderer
+
+    def set_fast_animations(self, on):
+        self.fast_animations_pending = on
+
+    def toggle_fast_animations(self):
+        on = self.fast_animations if self.fast_animations_pending is None else self.fast_animations_pending
+        self.set_fast_animations(not on)
+
+    def invalidate(self):
+        """Redraw the whole screen on the next frame"""
+        if self.renderer is not None:
+            self.renderer.invalidate()
+
+    def update(self, dt=LOGIC_STEP):
+        """Advance the game by one logic step of `dt` ms of game time
+
+        Needs no display, so the game can be simulated faster than real time.
+        Everything that changes the game happens here or in handle_swap(), so
+        the seed and the step number of every swap reproduce a game exactly.
+        """
+        self.steps += 1
+        self.game_time += dt
+
+        if self.fast_animations_pending is not None:
+            if self.fast_animations_pending != self.fast_animations:
+                self.fast_animations = self.fast_animations_pending
+                self.replay_log.record_fast_animations(self.steps, self.fast_animations)
+            self.fast_animations_pending = None
+
+        # Play animations and the game logic queued behind them
+        with profiler.phase('animations'):
+            self.animations.update(dt)
+
+        elapsed_seconds = int(self.game_time - self.level_start_time) // 1000
+        self.time_remaining = max(0, self.level_time_limit - elapsed_seconds)
+
+        # Spawn new bombs periodically (every 10 seconds), waiting for a running cascade to settle
+        if self.game_time - self.bomb_spawn_timer > self.bomb_spawn_interval and not self.animating:
+            self.bomb_spawn_timer = self.game_time
+            if self.level > 1:  # Only spawn bombs after level 1
+                self.place_bombs()
+                # A bomb can take the last legal move, and a shown hint may now point at one
+                self.reshuffle_if_dead()
+                self.hint_move = None
+
+        # Game over if time runs out
+        if self.time_remaining <= 0:
+            self.end_game()
+
+        if not self.animating and not self.game_over:
+            # Check level completion (NEW)
+            with profiler.phase('level_check'):
+                completed = self.check_level_completed()
+            if not completed and self.moves_remaining <= 0:
+                # Game over check (existing)
+                self.end_game()
+
+    def handle_falling_tiles(self, dt=LOGIC_STEP):
+        """Advance the falling tiles by `dt` ms, returning False once none are left
+
+        The engine already put every tile in the grid; a tile's cell is
+        just drawn empty until the tile has landed there.
+        """
+        if not self.falling.busy:
+            return False
+        self.falling.advance(FALL_SPEED * dt)
+        return True
 
-        # ALWAYS decrease moves, whether match was made or not
-        self.moves_remaining -= 1
+    def handle_swap(self, pos1, pos2):
+        """Queue the swap animation and the cascade behind it; the main loop plays them"""
         self.selected_tile = None
-        self.animating = False
+        self.hint_move = None
 
-    def draw_all(self, screen):
-        """Helper to draw everything"""
-        screen.fill(WHITE)
-        self.draw_grid(screen)
-        self.draw_score_level_and_moves(screen)
+        # Swaps that can't create a match are rejected straight from the legal-move index
+        if not self.is_legal_move(pos1, pos2):
+            return False
 
-    def fill_empty_spaces(self):
-        """Fill empty spaces in the grid with falling tiles, ignoring blockers and bombs"""
-        made_changes = False
+        self.replay_log.record_swap(self.steps, pos1, pos2)
 
-        for x in range(GRID_SIZE):
-            empty_slots = []
+        # The engine plays the swap and every cascade now
+        board = self.grid.copy()
+        with profiler.phase('resolve_move'):
+            result = self.apply_move(pos1, pos2)
+        if self.fast_animations:
+            return True  # the renderer just draws the new board
 
-            # Step 1: From bottom to top, collect empty y positions (but skip blockers and bombs)
-            for y in range(GRID_SIZE - 1, -1, -1):
-                if self.grid[y][x] is None:
-                    empty_slots.append(y)
-                elif self.grid[y][x] in ['blocker', 'bomb']:
-                    continue
-                elif empty_slots:
-                    # Move this tile down to the lowest available empty slot
-                    new_y = empty_slots.pop(0)
-                    self.falling_tiles.append({
-                        "x": x,
-                        "y": y * TILE_SIZE + 50,
-                        "target_y": new_y,
-                        "type": self.grid[y][x]
-                    })
-                    self.grid[y][x] = None
-                    empty_slots.append(y)  # The tile just moved creates a new empty spot
-                    made_changes = True
-
-            # Step 2: Add new tiles from the top for remaining empty slots
-            for i, y in enumerate(reversed(empty_slots)):
-                # 5% chance to spawn a bomb instead of candy (only if level > 1)
-                if self.level > 1 and random.random() < 0.03 and len(self.bomb_positions) < (self.level // 2 + 1):
-                    tile_type = 'bomb'
-                    self.bomb_positions.add((x, y))
-                else:
-                    tile_type = random.choice(CANDY_TILES)
-
-                self.falling_tiles.append({
-                    "x": x,
-                    "y": -((i + 1) * TILE_SIZE) + 50,
-                    "target_y": y,
-                    "type": tile_type
-                })
-                made_changes = True
-
-        return made_changes
-
-    def process_matches(self):
-        """Process all matches and cascading effects"""
-        while True:
-            # Handle any falling tiles first
-            if self.handle_falling_tiles():
-                return True  # Need to wait for animation
-
-            # Check for matches
-            matches = self.check_matches()
-            if not matches:
-                break
-
-            # Remove matches and fill empty spaces
-            self.remove_matches(matches)
-            self.fill_empty_spaces()
+        # Play the move back on the board from before the swap
+        self.shown_grid = board
+        self.score_pending = result.score_delta
+        self.animate_swap(pos1, pos2)
 
-        return False
+        def swap():
+            (x1, y1), (x2, y2) = pos1, pos2
+            board[y1, x1], board[y2, x2] = board[y2, x2], board[y1, x1]
+
+        self.animations.call(swap)
+        self.animations.call(lambda: self.play_steps(result.steps))
+        return True
 
-    def draw_grid(self, screen):
-        """Draw the game grid with tiles"""
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                if self.grid[y][x] is not None:
-                    screen.blit(IMAGESDICT[self.grid[y][x]], (x * TILE_SIZE, y * TILE_SIZE + 50))
-
-        # Draw selection highlight
-        if self.selected_tile:
-            x, y = self.selected_tile
-            pygame.draw.rect(screen, (255, 255, 255), (x * TILE_SIZE, y * TILE_SIZE + 50, TILE_SIZE, TILE_SIZE), 3)
-
-    def is_adjacent(self, pos1, pos2):
-        """Check if two positions are adjacent"""
-
-        x1, y1 = pos1
-        x2, y2 = pos2
-        return (abs(x1 - x2) == 1 and y1 == y2) or (abs(y1 - y2) == 1 and x1 == x2)
-
-    def swap_tiles(self, pos1, pos2):
-        """Swap two tiles on the grid"""
-        x1, y1 = pos1
-        x2, y2 = pos2
-        self.grid[y1][x1], self.grid[y2][x2] = self.grid[y2][x2], self.grid[y1][x1]
-
-    def animate_swap(self, tile1_pos, tile2_pos, screen, speed=8):
-        """Animate the swap between two tiles"""
+    def play_steps(self, steps):
+        """Queue the clear and fall animations of the next resolved cascade step, then the rest"""
+        if not steps:
+            # Show the engine's board, which may also have been reshuffled
+            self.shown_grid = None
+            self.score_pending = 0
+            return
+        step = steps[0]
+        self.animate_clear(step.cleared)
+
+        def remove_and_fill():
+            # Clear the matches and the bombs that went off, then make candies fall
+            board = self.shown_grid
+            board[step.cleared[1], step.cleared[0]] = EMPTY
+            board[step.bombs[1], step.bombs[0]] = EMPTY
+            board[step.moves.from_y, step.moves.x] = EMPTY
+            for moves in (step.moves, step.spawns):
+                board[moves.to_y, moves.x] = moves.tile
+                self.falling.start(moves.x, moves.from_y * self.tile_size, moves.to_y,
+                                   moves.to_y * self.tile_size, moves.tile)
+            self.score_pending -= step.score_delta
+
+        self.animations.call(remove_and_fill)
+        self.animations.until(self.handle_falling_tiles)
+        self.animations.call(lambda: self.play_steps(steps[1:]))
+
+    def end_animation(self):
+        self.animation_hidden = NO_CELLS
+        self.animation_sprites = []
+
+    def draw_all(self, screen, alpha=1.0):
+        """Draw the board and HUD and push the parts that changed to the display
+
+        `alpha` is how far the game time has got between the last logic step
+        and the next one; moving tiles are drawn interpolated by it.
+        """
+        renderer = self.board_renderer()
+        view = renderer.board_rect
+        hidden = (self.falling.cells(), self.animation_hidden)
+
+        # Falling tiles are positioned on screen; only those inside the viewport are drawn
+        images = renderer.tile_images
+        sprites = []
+        if self.falling.busy:
+            clip = (view.left - self.tile_size, view.top - self.tile_size, view.right, view.bottom)
+            xs, ys, tiles = self.falling.positions(alpha, self.tile_size, renderer.to_screen(0, 0), clip)
+            sprites = [(images[tile], (x, y)) for x, y, tile in zip(xs.tolist(), ys.tolist(), tiles.tolist())]
+
+        self.animations.interpolate(alpha)
+        for tile, x, y, size in self.animation_sprites:
+            image = images[tile]
+            if size != self.tile_size:
+                image = pygame.transform.smoothscale(image, (size, size))
+            sprites.append((image, renderer.to_screen(x, y)))
+
+        outlines = []
+        # Selection highlight
+        if self.selected_tile and renderer.visible(*self.selected_tile):
+            outlines.append((WHITE, renderer.cell_rect(*self.selected_tile)))
+        # Hint highlight
+        if self.hint_move:
+            outlines.extend((GOLD, renderer.cell_rect(x, y)) for x, y in self.hint_move if renderer.visible(x, y))
+
+        # Frame profiler overlay, drawn as a sprite so the renderer restores the board under it
+        overlay = profiler.overlay(FONTS['profile'])
+        if overlay is not None:
+            sprites.append((overlay, (max(0, view.right - overlay.get_width()), view.top)))
+
+        with profiler.phase('draw_board'):
+            renderer.draw_board(self.shown(), hidden, sprites, outlines)
+        if renderer.hud_changed((self.score - self.score_pending, self.target_score, self.level, self.moves_remaining,
+                                 self.time_remaining)):
+            with profiler.phase('draw_hud'):
+                self.draw_score_level_and_moves(screen)
+        with profiler.phase('present'):
+            renderer.present()
+
+    def shown(self):
+        """The board as the player currently sees it"""
+        return self.grid if self.shown_grid is None else self.shown_grid
+
+    def animate_swap(self, tile1_pos, tile2_pos):
+        """Queue the swap animation between two tiles (purely visual, the grid is not changed)"""
         x1, y1 = tile1_pos
         x2, y2 = tile2_pos
-
-        # Get initial positions
-        tile1_rect = pygame.Rect(x1 * TILE_SIZE, y1 * TILE_SIZE + 50, TILE_SIZE, TILE_SIZE)
-        tile2_rect = pygame.Rect(x2 * TILE_SIZE, y2 * TILE_SIZE + 50, TILE_SIZE, TILE_SIZE)
-
-        # Calculate direction vectors
-        dx1 = (x2 - x1) * speed
-        dy1 = (y2 - y1) * speed
-        dx2 = (x1 - x2) * speed
-        dy2 = (y1 - y2) * speed
-
-        # Perform the animation
-        distance = max(abs(x2 - x1), abs(y2 - y1)) * TILE_SIZE
-        steps = distance // speed
-
-        for _ in range(steps):
-            screen.fill(WHITE)
-
-            # Move tiles
-            tile1_rect.x += dx1
-            tile1_rect.y += dy1
-            tile2_rect.x += dx2
-            tile2_rect.y += dy2
-
-            # Draw everything
-            self.draw_grid(screen)
-            self.draw_score_level_and_moves(screen)
-
-            # Draw the moving tiles on top
-            screen.blit(IMAGESDICT[self.grid[y1][x1]], tile1_rect)
-            screen.blit(IMAGESDICT[self.grid[y2][x2]], tile2_rect)
-
-            pygame.display.flip()
-            clock.tick(60)
-
-        # Finalize the swap
-        self.swap_tiles(tile1_pos, tile2_pos)
+        tile1 = int(self.shown()[y1, x1])
+        tile2 = int(self.shown()[y2, x2])
+
+        size = self.tile_size
+        hidden = (np.array([x1, x2]), np.array([y1, y2]))
+
+        def update(progress):
+            # Each tile moves towards the other one's cell
+            dx = (x2 - x1) * size * progress
+            dy = (y2 - y1) * size * progress
+            self.animation_hidden = hidden
+            self.animation_sprites = [
+                (tile1, x1 * size + dx, y1 * size + dy, size),
+                (tile2, x2 * size - dx, y2 * size - dy, size),
+            ]
+
+        self.animations.tween(SWAP_DURATION, update)
+        self.animations.call(self.end_animation)
+
+    def animate_clear(self, cells):
+        """Queue the animation of the (xs, ys) cells shrinking away (the board is not changed)"""
+        hidden = cells
+        tiles = self.shown()[cells[1], cells[0]].tolist()
+        cells = list(zip(cells[0].tolist(), cells[1].tolist()))
+
+        tile_size = self.tile_size
+
+        def update(progress):
+            size = int(tile_size * (1 - progress))
+            inset = (tile_size - size) // 2
+            self.animation_hidden = hidden
+            self.animation_sprites = [
+                (tile, x * tile_size + inset, y * tile_size + inset, size)
+                for (x, y), tile in zip(cells, tiles)
+            ] if size > 0 else []
+
+        self.animations.tween(CLEAR_DURATION, update)
+        self.animations.call(self.end_animation)
 
     def draw_score_level_and_moves(self, screen):
         """Draw the score, level, and moves remaining"""
         # Background panel
-        pygame.draw.rect(screen, GRAY, (0, 0, WIDTH, 50))
+        pygame.draw.rect(screen, GRAY, (0, 0, WIDTH, HUD_HEIGHT))
 
         # Format time as MM:SS
         minutes = self.time_remaining // 60
@@ -557,10 +548,10 @@ class GameState:
         time_color = RED if self.time_remaining < 10 else BLACK
 
         # Texts
-        score_text = font.render(f"Score: {self.score}/{self.target_score}", True, BLACK)
-        level_text = font.render(f"Level: {self.level}", True, BLACK)
-        moves_text = font.render(f"Moves: {self.moves_remaining}", True, BLACK)
-        timer_text = font.render(time_text, True, time_color)
+        score_text = render_text(font, f"Score: {self.score - self.score_pending}/{self.target_score}", BLACK)
+        level_text = render_text(font, f"Level: {self.level}", BLACK)
+        moves_text = render_text(font, f"Moves: {self.moves_remaining}", BLACK)
+        timer_text = render_text(font, time_text, time_color)
 
         # Positions
         screen.blit(score_text, (10, 10))
@@ -569,8 +560,8 @@ class GameState:
         screen.blit(timer_text, (WIDTH - 100, 10))  # Bottom right of panel
 
     def check_level_completed(self):
-        if self.score >= self.target_score:
-            time_taken = (pygame.time.get_ticks() - self.level_start_time) / 1000
+        if self.is_level_completed():
+            time_taken = (self.game_time - self.level_start_time) / 1000
 
             self.ai.record_performance(
                 level=self.level,
@@ -580,24 +571,22 @@ class GameState:
             )
 
             # Get both move limit and time limit from AI
-            self.move_limit, self.level_time_limit = self.ai.calculate_difficulty()
+            move_limit, self.level_time_limit = self.ai.calculate_difficulty()
 
             # Prepare for next level
-            self.level += 1
-            self.score = 0
-            self.moves_remaining = self.move_limit
+            self.start_next_level(move_limit)
             self.time_remaining = self.level_time_limit
-            self.reset_grid()
-            self.level_start_time = pygame.time.get_ticks()
+            self.level_start_time = self.game_time
 
-            self.display_level_complete(screen)
+            # The main loop shows the level complete screen
+            self.level_complete_pending = True
             return True
         return False
 
     def display_level_transition(self):
         """Show level transition message"""
         screen.fill(BLACK)
-        level_text = large_font.render(f"LEVEL {self.level} START!", True, WHITE)
+        level_text = render_text(large_font, f"LEVEL {self.level} START!", WHITE)
         screen.blit(level_text, (WIDTH // 2 - level_text.get_width() // 2, HEIGHT // 2))
         pygame.display.flip()
         pygame.time.delay(1500)  # Show for 1.5 seconds
@@ -616,200 +605,216 @@ class GameState:
             # Player is struggling - make easier
             self.move_limit = min(30, self.move_limit + 2)
 
-    def reset_grid(self):
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                if (x, y) not in self.blocker_positions and (x, y) not in self.bomb_positions:
-                    self.grid[y][x] = random.choice(CANDY_TILES)
-        self.ensure_no_matches_at_start()
-        self.place_blockers_for_level()
-        self.place_bombs()
-
-    def display_game_over(self, screen):
-        """Display game over screen with guaranteed visibility"""
+    def end_game(self):
+        """Finish the game; the high score is saved exactly once per game"""
+        if self.game_over:
+            return
         self.game_over = True
+        self.replay_log.finish(self.steps, self)
 
-        # 1. Create a solid dark background
-        overlay = pygame.Surface((WIDTH, HEIGHT))
-        overlay.fill((0, 0, 0))  # Solid black background
-        screen.blit(overlay, (0, 0))
+        # Record the game in the player's history and update the high score
+        try:
+            if player_data:
+                player_data['highscore'] = profiles.record_game(player_data['name'], self.total_score, self.level)
+        except Exception as e:
+            print(f"Error saving high score: {e}")
 
-        # 2. Create text with fallback fonts
+    def save_replay(self):
+        """Write this game's replay log (once) to REPLAY_DIR"""
+        if self.replay_saved:
+            return
+        self.replay_saved = True
         try:
-            # Try using Arial first
-            large_font = pygame.font.SysFont('Arial', 72, bold=True)
-            font = pygame.font.SysFont('Arial', 36)
-        except:
-            # Fallback to default fonts
-            large_font = pygame.font.Font(None, 72)
-            font = pygame.font.Font(None, 36)
-
-        # 3. Render bright red text (guaranteed visibility)
-        game_over_text = large_font.render("GAME OVER", True, (255, 0, 0))
-        restart_text = font.render("Press R to restart - Q to quit", True, (255, 255, 255))
-
-        # 4. Center the text with more spacing
-        screen.blit(game_over_text,
-                    (WIDTH // 2 - game_over_text.get_width() // 2,
-                     HEIGHT // 2 - 50))
-        screen.blit(restart_text,
-                    (WIDTH // 2 - restart_text.get_width() // 2,
-                     HEIGHT // 2 + 50))
+            self.replay_log.save(replay_path(self.replay_log, player_data['name'] if player_data else 'player'))
+        except OSError as e:
+            print(f"Error saving replay: {e}")
 
+    def display_game_over(self, screen):
+        """Display the game over screen (rendered once and reused)"""
+        self.end_game()
+        screen.blit(game_over_screen(), (0, 0))
         pygame.display.flip()
-
-        # 5. High score update logic
-        try:
-            if player_data and self.total_score > player_data['highscore']:
-                player_data['highscore'] = self.total_score
-                save_player_data(player_data['name'], self.total_score)
-        except Exception as e:
-            print(f"Error saving high score: {e}")
+        self.game_over_drawn = True
 
     def display_level_complete(self, screen):
         """Display and wait on level complete screen"""
-        # 1. Create a solid overlay (more reliable than SRCALPHA for some systems)
-        overlay = pygame.Surface((WIDTH, HEIGHT))
-        overlay.fill((0, 0, 0))
-        overlay.set_alpha(180)  # Semi-transparent
-        screen.blit(overlay, (0, 0))
-
-        # 2. Render text with fallback fonts
-        try:
-            # Try to use Arial if available
-            title_font = pygame.font.SysFont('Arial', 72, bold=True)
-            prompt_font = pygame.font.SysFont('Arial', 36)
-        except:
-            # Fallback to default fonts
-            title_font = large_font
-            prompt_font = font
-
-        # 3. Create text with outline for better visibility
-        # Main text (white with red outline)
-        title_text = title_font.render(f"LEVEL {self.level - 1} COMPLETE!", True, WHITE)
-        title_outline = title_font.render(f"LEVEL {self.level - 1} COMPLETE!", True, RED)
-
-        # Prompt text (yellow with dark outline)
-        prompt_text = prompt_font.render("Press any key to continue", True, (255, 255, 0))
-        prompt_outline = prompt_font.render("Press any key to continue", True, (50, 50, 50))
-
-        # 4. Draw text with outline effect
-        title_pos = (WIDTH // 2 - title_text.get_width() // 2, HEIGHT // 2 - 80)
-        prompt_pos = (WIDTH // 2 - prompt_text.get_width() // 2, HEIGHT // 2 + 20)
-
-        # Draw outlines (offset by 1 pixel)
-        screen.blit(title_outline, (title_pos[0] + 1, title_pos[1] + 1))
-        screen.blit(prompt_outline, (prompt_pos[0] + 1, prompt_pos[1] + 1))
-        # Draw main text
-        screen.blit(title_text, title_pos)
-        screen.blit(prompt_text, prompt_pos)
-
-        # 5. Add decorative elements
-        pygame.draw.rect(screen, (255, 215, 0),  # Gold border
-                         (WIDTH // 2 - 200, HEIGHT // 2 - 120, 400, 200), 3)
-
+        screen.blit(level_complete_overlay(self.level - 1), (0, 0))
         pygame.display.flip()
 
-        # 7. Wait for key press
+        # Wait for key press
         waiting = True
         while waiting:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    return False
+                    shutdown(self)
                 elif event.type == pygame.KEYDOWN:
                     waiting = False
             clock.tick(30)
 
-        return True
 
+def init_display():
+    """Open the window and load fonts and images (the display resources of this module)"""
+    global screen, FONTS, font, large_font, clock, IMAGESDICT
 
-# Clock
-clock = pygame.time.Clock()
+    # Initialize Pygame
+    with startup_phase('pygame init'):
+        pygame.init()
 
-# Initialize game state
-game_state = GameState()
+    # Initialize screen FIRST (before loading images)
+    with startup_phase('display init'):
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Candy Crush Clone")
 
-# Main game loop
-running = True
-last_level_transition = 0
-while running:
-    current_time = pygame.time.get_ticks()
-    elapsed_seconds = (current_time - game_state.level_start_time) // 1000
-    game_state.time_remaining = max(0, game_state.level_time_limit - elapsed_seconds)
+    # Font initialization (after screen is created)
+    with startup_phase('font load'):
+        FONTS = load_fonts()
+        font = FONTS['hud']
+        large_font = FONTS['large']
 
-    # Spawn new bombs periodically (every 10 seconds)
-    if current_time - game_state.bomb_spawn_timer > game_state.bomb_spawn_interval:
-        game_state.bomb_spawn_timer = current_time
-        if game_state.level > 1:  # Only spawn bombs after level 1
-            game_state.place_bombs()
+    # Load images (the opening screen needs the title image)
+    with startup_phase('IMAGESDICT build'):
+        IMAGESDICT = load_images()
+        tile_images.cache_clear()
 
-    # Game over if time runs out
-    if game_state.time_remaining <= 0 and not game_state.game_over:
-        game_state.game_over = True
-        game_state.display_game_over(screen)
+    # Clock
+    clock = pygame.time.Clock()
 
-    current_time = pygame.time.get_ticks()
-    screen.fill(WHITE)
 
-    # Event handling - MOVED TO TOP
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-            # Skip input during transitions
-        if current_time - last_level_transition < LEVEL_TRANSITION_DELAY:
-            continue
-
-        # Handle input both during game and game over
-        if event.type == pygame.KEYDOWN:
-            if game_state.game_over:
-                if event.key == pygame.K_r:
-                    # Restart game
-                    game_state = GameState()
-                elif event.key == pygame.K_q:
+def main():
+    global profiles, player_data
+
+    init_display()
+
+    # Load player data and show intro screen
+    with startup_phase('save-file load'):
+        profiles = open_profiles()
+        player_data = profiles.last_player()
+    new_player = show_opening_screen(screen, font, player_data)
+
+    if not player_data or new_player:
+        name = get_name_input(screen, font)
+    else:
+        name = player_data['name']
+    player_data = profiles.use_player(name)
+
+    # Initialize game state (--seed N replays the same first game, --board WxH picks the board size)
+    with startup_phase('GameState()'):
+        seed = int(sys.argv[sys.argv.index('--seed') + 1]) if '--seed' in sys.argv else None
+        board_size = parse_board_size(sys.argv[sys.argv.index('--board') + 1]) if '--board' in sys.argv else None
+        game_state = GameState(AIModule(model_path=ai_model_path(player_data['name'])), seed, board_size,
+                               FAST_ANIMATIONS)
+
+    if STARTUP_REPORT:
+        print_startup_report()
+
+    # Main game loop
+    running = True
+    last_level_transition = 0
+    # Without a real display nobody is watching, so run the game logic as fast as possible
+    headless = pygame.display.get_driver() == 'dummy'
+    accumulator = 0.0
+    while running:
+        profiler.next_frame()
+        current_time = pygame.time.get_ticks()
+
+        # Event handling - MOVED TO TOP
+        with profiler.phase('events'):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
                     running = False
+                elif event.type == pygame.VIDEOEXPOSE:
+                    # The window contents were lost; redraw everything
+                    game_state.game_over_drawn = False
+                    game_state.invalidate()
 
-        elif (event.type == pygame.MOUSEBUTTONDOWN
-              and not game_state.animating
-              and not game_state.game_over):
-            x, y = event.pos
-            grid_x, grid_y = x // TILE_SIZE, (y - 50) // TILE_SIZE
-
-            if 0 <= grid_x < GRID_SIZE and 0 <= grid_y < GRID_SIZE:
-                if game_state.selected_tile is None:
-                    game_state.selected_tile = (grid_x, grid_y)
-                else:
-                    if game_state.grid[grid_y][grid_x] == 'blocker' or (
-                            game_state.selected_tile and
-                            game_state.grid[game_state.selected_tile[1]][game_state.selected_tile[0]] == 'blocker'):
-                        game_state.selected_tile = None  # Deselect on invalid click
-                        continue  # Skip the swap
-
-                    if game_state.is_adjacent(game_state.selected_tile, (grid_x, grid_y)):
-                        game_state.handle_swap(
-                            game_state.selected_tile,
-                            (grid_x, grid_y),
-                            screen
-                        )
-                    else:
-                        game_state.selected_tile = (grid_x, grid_y)
-
-    # Draw everything
-    game_state.draw_grid(screen)
-    game_state.draw_score_level_and_moves(screen)
-
-    # Check level completion (NEW)
-    game_state.check_level_completed()
-
-    # Game over check (existing)
-    if game_state.moves_remaining <= 0 and not game_state.game_over:
-        game_state.game_over = True
-        game_state.display_game_over(screen)
-    elif game_state.game_over:
-        game_state.display_game_over(screen)
+                    # Skip input during transitions
+                if current_time - last_level_transition < LEVEL_TRANSITION_DELAY:
+                    continue
+
+                # Handle input both during game and game over
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F3:
+                        profiler.toggle_overlay()
+                    elif game_state.game_over:
+                        if event.key == pygame.K_r:
+                            # Restart game
+                            game_state.save_replay()
+                            height, width = game_state.grid.shape
+                            game_state = GameState(game_state.ai, size=(width, height),
+                                                   fast_animations=game_state.fast_animations)
+                        elif event.key == pygame.K_q:
+                            running = False
+                    elif event.key == pygame.K_f:
+                        # Fast animations: every swap settles at once
+                        game_state.toggle_fast_animations()
+                    elif event.key == pygame.K_h and not game_state.animating:
+                        # Show a swap that creates a match
+                        game_state.hint_move = game_state.hint()
+                    elif event.key in SCROLL_KEYS:
+                        game_state.board_renderer().scroll(*SCROLL_KEYS[event.key])
+
+                elif event.type == pygame.MOUSEWHEEL and not game_state.game_over:
+                    # Wheel scrolls rows, sideways (or shift + wheel) scrolls columns
+                    dx, dy = -event.x, -event.y * 3
+                    if pygame.key.get_mods() & pygame.KMOD_SHIFT:
+                        dx, dy = dy, 0
+                    game_state.board_renderer().scroll(dx, dy)
+
+                elif (event.type == pygame.MOUSEBUTTONDOWN
+                      and event.button == 1  # pygame 2 still reports the wheel as buttons 4 and 5
+                      and not game_state.animating
+                      and not game_state.game_over):
+                    cell = game_state.board_renderer().cell_at(event.pos)
+
+                    if cell is not None:
+                        grid_x, grid_y = cell
+                        if game_state.selected_tile is None:
+                            game_state.selected_tile = (grid_x, grid_y)
+                        else:
+                            selected_x, selected_y = game_state.selected_tile
+                            if (game_state.grid[grid_y, grid_x] == BLOCKER
+                                    or game_state.grid[selected_y, selected_x] == BLOCKER):
+                                game_state.selected_tile = None  # Deselect on invalid click
+                                continue  # Skip the swap
+
+                            if game_state.is_adjacent(game_state.selected_tile, (grid_x, grid_y)):
+                                game_state.handle_swap(
+                                    game_state.selected_tile,
+                                    (grid_x, grid_y)
+                                )
+                            else:
+                                game_state.selected_tile = (grid_x, grid_y)
+
+        # Run as many fixed logic steps as the elapsed time calls for, skipping
+        # rendered frames rather than slowing the game down when we fall behind
+        with profiler.phase('wait'):
+            accumulator += LOGIC_STEP if headless else clock.tick(FPS)
+        steps = 0
+        with profiler.phase('logic'):
+            while accumulator >= LOGIC_STEP and steps < MAX_LOGIC_STEPS:
+                game_state.update(LOGIC_STEP)
+                accumulator -= LOGIC_STEP
+                steps += 1
+        accumulator = min(accumulator, LOGIC_STEP)
+
+        if game_state.level_complete_pending:
+            game_state.level_complete_pending = False
+            game_state.display_level_complete(screen)
+            game_state.invalidate()
+
+        if game_state.game_over:
+            game_state.save_replay()
+            # The game over screen only needs drawing once
+            if not game_state.game_over_drawn:
+                with profiler.phase('game_over'):
+                    game_state.display_game_over(screen)
+                game_state.invalidate()
+        else:
+            # Draw everything that changed
+            game_state.draw_all(screen, accumulator / LOGIC_STEP)
+
+    shutdown(game_state)
 
-    pygame.display.flip()
-    clock.tick(60)
 
-pygame.quit()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
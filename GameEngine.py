@@ -0,0 +1,845 @@
+import copy
+from collections import namedtuple
+
+import numpy as np
+
+GRID_SIZE = 8
+MIN_BOARD_SIZE = 3  # boards may be non-square, each side within these bounds
+MAX_BOARD_SIZE = 256
+
+# Tile codes stored in the np.int8 grid
+EMPTY = 0
+BLUE, GREEN, ORANGE, PURPLE, RED, YELLOW = range(1, 7)
+BLOCKER = 7
+BOMB = 8
+CANDY_TILES = (BLUE, GREEN, ORANGE, PURPLE, RED, YELLOW)
+
+# Image/display name of every tile code (indexed by code)
+TILE_NAMES = (None, 'blue candy', 'green candy', 'orange candy', 'purple candy', 'red candy', 'yellow candy',
+              'blocker', 'bomb')
+
+# Lookup tables indexed by tile code
+IS_CANDY = np.zeros(len(TILE_NAMES), dtype=bool)
+IS_CANDY[list(CANDY_TILES)] = True
+IS_FIXED = np.zeros(len(TILE_NAMES), dtype=bool)  # tiles that never fall or match
+IS_FIXED[[BLOCKER, BOMB]] = True
+
+# Candies pre-generated per column for refills (at least one board height)
+REFILL_STREAM_LENGTH = 64
+
+# check_dirty_matches() falls back to a full scan unless it can skip at least this many cells.
+# The incremental scan is for large boards only: it starts paying off at about 64x64, and
+# the default 8x8 board (64 cells) always takes the full scan.
+DIRTY_SCAN_MIN_SKIPPED = 2048
+
+# Result of GameEngine.apply_move:
+#   valid       - True if the swap produced at least one match (otherwise nothing was played)
+#   cascade     - list of match lists, one entry per cascade step
+#   score_delta - change in score caused by the move (bomb penalties included)
+#   diff        - {(x, y): tile code} for every cell whose tile changed
+#   steps       - CascadeStep of every cascade step, for animating the move afterwards
+MoveResult = namedtuple('MoveResult', ['valid', 'cascade', 'score_delta', 'diff', 'steps'])
+
+# Tiles moved by GameEngine.fill_empty_spaces, as parallel arrays with one entry per tile
+TileMoves = namedtuple('TileMoves', ['x', 'from_y', 'to_y', 'tile'])
+
+# One step of a cascade, as resolved by GameEngine.resolve_steps:
+#   matches     - the matches cleared in this step
+#   cleared     - (xs, ys) arrays of the cells the matches emptied, each cell once
+#   bombs       - (xs, ys) arrays of the bombs next to the matches that went off
+#   score_delta - change in score caused by this step (bomb penalties included)
+#   moves       - TileMoves of the tiles that fell
+#   spawns      - TileMoves of the new tiles (from_y < 0)
+CascadeStep = namedtuple('CascadeStep', ['matches', 'cleared', 'bombs', 'score_delta', 'moves', 'spawns'])
+
+
+def board_shape(size):
+    """(height, width) of a board given as a side length or a (width, height) pair"""
+    width, height = (size, size) if np.isscalar(size) else size
+    width, height = int(width), int(height)
+    if not (MIN_BOARD_SIZE <= width <= MAX_BOARD_SIZE and MIN_BOARD_SIZE <= height <= MAX_BOARD_SIZE):
+        raise ValueError(f"Board sides must be {MIN_BOARD_SIZE} to {MAX_BOARD_SIZE} cells, got {width}x{height}")
+    return height, width
+
+
+def match_cells(matches):
+    """(xs, ys) arrays of the cells of a non-empty list of matches (cells in two matches appear twice)"""
+    cells = np.array([cell for match in matches for cell in match], dtype=np.intp)
+    return cells[:, 0], cells[:, 1]
+
+
+def merge_runs(starts, step):
+    """Merge overlapping run starts into [start, length] runs
+
+    `starts` are flat indices of cells that begin 3 equal candies in a row
+    and `step` is the flat distance between neighbouring cells of a run.
+    Overlapping starts must be consecutive in `starts`.
+    """
+    runs = []
+    for i in starts:
+        last = runs[-1] if runs else None
+        if last and last[0] + (last[1] - 2) * step == i:
+            last[1] += 1
+        else:
+            runs.append([i, 3])
+    return runs
+
+
+def line_runs(lines):
+    """Find runs of 3+ equal candies along the rows of `lines`, as (row, start, length)
+
+    The last column of `lines` must not hold a candy (the board's EMPTY
+    padding), so that runs can be found on the flattened rows with shifted
+    comparisons without continuing from one row into the next.
+    """
+    width = lines.shape[1]
+    cells = lines.ravel()
+    same = cells[:-1] == cells[1:]
+    starts = np.flatnonzero(same[:-1] & same[1:] & IS_CANDY[cells[:-2]])
+    runs = []
+    for start, length in merge_runs(starts.tolist(), 1):
+        row, col = divmod(start, width)
+        runs.append((row, col, length))
+    return runs
+
+
+class RunScan:
+    """Preallocated views and buffers that find the run starts of a padded board in three ufunc calls
+
+    `cells` is the board with one column and two rows of padding. Row 0 of
+    every (2, n) array below is about horizontal neighbours (1 cell apart)
+    and row 1 about vertical ones (`stride` cells apart), so each step is
+    one call for both directions. On small boards the cost is the number of
+    calls, not the cells, so find() only compares values: runs of blockers,
+    bombs or EMPTY are dropped from the few starts it finds.
+    """
+
+    def __init__(self, cells):
+        height, stride = cells.shape
+        # EMPTY and BLOCKER down the padding column, which then never holds a run itself
+        cells[1::2, -1] = BLOCKER
+        self.stride = stride
+        n = (height - 2) * stride  # a start for every cell of the board rows
+        pairs = n + stride  # the pairs of every start, in both directions
+        self.flat = cells.ravel()
+        # same[d, i]: cell i and its neighbour in direction d are equal
+        # (the views are built with np.ndarray, which costs far less than as_strided)
+        self.here = np.ndarray((2, pairs), np.int8, self.flat, 0, (0, 1))
+        self.next = np.ndarray((2, pairs), np.int8, self.flat, 1, (stride - 1, 1))
+        self.same = np.zeros((2, pairs), dtype=bool)
+        # starts[d, i]: so are that neighbour and the next one
+        self.first = self.same[:, :n]
+        self.second = np.ndarray((2, n), bool, self.same, 1, (pairs + stride - 1, 1))
+        self.starts = np.zeros((2, n), dtype=bool)
+
+    def find(self):
+        """False if the board has no run of 3 equal cells, so none of 3 candies either"""
+        np.equal(self.here, self.next, out=self.same)
+        np.logical_and(self.first, self.second, out=self.starts)
+        return np.count_nonzero(self.starts) > 0
+
+    def candy_starts(self, direction):
+        starts = self.starts[direction].nonzero()[0]
+        return starts[IS_CANDY[self.flat[starts]]]
+
+    def horizontal(self):
+        """Flat indices of the horizontal candy run starts found by find(), row by row"""
+        return self.candy_starts(0).tolist()
+
+    def vertical(self):
+        """Flat indices of the vertical candy run starts found by find(), column by column"""
+        starts = self.candy_starts(1)
+        if len(starts) > 1:
+            starts = starts[np.argsort(starts % self.stride, kind='stable')]
+        return starts.tolist()
+
+
+def window_runs(grid, lines, start, stop):
+    """Runs of 3+ equal candies on the rows `lines` of `grid` that overlap columns start:stop
+
+    Returns (index into lines, first column, length). Only the window is
+    scanned; runs touching its edges are extended cell by cell.
+    """
+    window = np.zeros((len(lines), stop - start + 1), dtype=np.int8)  # the extra column stays EMPTY
+    window[:, :-1] = grid[lines, start:stop]
+    width = grid.shape[1]
+    runs = []
+    for line, col, length in line_runs(window):
+        row = grid[lines[line]]
+        first, end = start + col, start + col + length
+        if col == 0:
+            while first > 0 and row[first - 1] == row[end - 1]:
+                first -= 1
+        if end == stop:
+            while end < width and row[end] == row[first]:
+                end += 1
+        runs.append((line, first, end - first))
+    return runs
+
+
+def swap_legality(tiles):
+    """For every cell, whether swapping it with its right / lower neighbour creates a match
+
+    Returns (east, south) bool arrays shaped like `tiles`. A candy moving
+    into a cell creates a match when two cells on a line through that cell,
+    other than the one the candy came from, hold the same candy. Blockers
+    can't be swapped.
+    """
+    height, width = tiles.shape
+    padded = np.zeros((height + 4, width + 4), dtype=np.int8)
+    padded[2:-2, 2:-2] = tiles
+
+    def at(dx, dy):
+        # The tile at (x + dx, y + dy) for every cell (x, y)
+        return padded[2 + dy:2 + dy + height, 2 + dx:2 + dx + width]
+
+    lines = [((-2, 0), (-1, 0)), ((-1, 0), (1, 0)), ((1, 0), (2, 0)),
+             ((0, -2), (0, -1)), ((0, -1), (0, 1)), ((0, 1), (0, 2))]
+
+    def completes(source):
+        # Cells where the candy from the neighbour at `source` would complete a run
+        mover = at(*source)
+        same = {offset: at(*offset) == mover for pair in lines for offset in pair if offset != source}
+        found = np.zeros(tiles.shape, dtype=bool)
+        for first, second in lines:
+            if source not in (first, second):
+                found |= same[first] & same[second]
+        return found & IS_CANDY[mover]
+
+    from_east = completes((1, 0))
+    from_west = completes((-1, 0))
+    from_south = completes((0, 1))
+    from_north = completes((0, -1))
+
+    swappable = tiles != BLOCKER
+    east = np.zeros(tiles.shape, dtype=bool)
+    east[:, :-1] = (from_east[:, :-1] | from_west[:, 1:]) & swappable[:, :-1] & swappable[:, 1:]
+    south = np.zeros(tiles.shape, dtype=bool)
+    south[:-1] = (from_south[:-1] | from_north[1:]) & swappable[:-1] & swappable[1:]
+    return east, south
+
+
+class GameEngine:
+    """Board rules (matching, gravity, scoring) with no dependency on pygame"""
+
+    # Level tuning: blockers added per level after the first, and levels per extra bomb
+    blockers_per_level = 2
+    levels_per_bomb = 2
+    # Blockers and bombs together never cover more than this share of the board (on 8x8,
+    # from level 14). Blockers always leave room for the level's bombs, and half the board
+    # stays free so bombs spawned during a level rarely leave the board dead.
+    max_fixed_density = 0.5
+
+    def __init__(self, seed=None, size=GRID_SIZE):
+        """`size` is the side of a square board or a (width, height) pair"""
+        self.rng = np.random.default_rng(seed)
+        height, width = board_shape(size)
+        # The board is stored with one extra column and two extra rows of
+        # non-candy cells so runs can be found on the flattened array without
+        # wrapping across rows or reading past the end. `grid` is a view of the real cells.
+        self.cells = np.zeros((height + 2, width + 1), dtype=np.int8)
+        self._grid = self.cells[:-2, :-1]
+        self.run_scan = RunScan(self.cells)
+        # Cells changed since the last check_dirty_matches(); only lines through them can hold new matches
+        self.dirty = np.zeros((height, width), dtype=bool)
+        # Columns that may hold EMPTY cells for the next fill_empty_spaces()
+        self.gap_columns = np.zeros(width, dtype=bool)
+        # Index of the swaps that create a match: legal_east[y, x] is the swap of (x, y)
+        # with (x + 1, y), legal_south[y, x] with (x, y + 1). It is rebuilt lazily
+        # around the cells marked in legal_stale.
+        self.legal_east = np.zeros((height, width), dtype=bool)
+        self.legal_south = np.zeros((height, width), dtype=bool)
+        self.legal_stale = np.ones((height, width), dtype=bool)
+        # Each column draws refill candies from its own pre-generated stream
+        self.refill_streams = self.random_candies((width, max(REFILL_STREAM_LENGTH, height)))
+        self.refill_next = np.zeros(width, dtype=np.intp)
+        self.score = 0
+        self.level = 1
+        self.total_score = 0
+        self.target_score = 1000
+        self.move_limit = 20
+        self.moves_remaining = self.move_limit
+        self.blocker_positions = set()
+        self.bomb_positions = set()
+        self.reset_grid()
+
+    @property
+    def grid(self):
+        return self._grid
+
+    @grid.setter
+    def grid(self, tiles):
+        self._grid[...] = tiles
+        self.dirty[...] = True
+        self.gap_columns[...] = True
+        self.legal_stale[...] = True
+
+    def random_candies(self, size):
+        return self.rng.integers(BLUE, YELLOW + 1, size=size, dtype=np.int8)
+
+    def random_free_cells(self, count, reserve=0):
+        """Up to `count` distinct random cells holding neither a blocker nor a bomb, as (xs, ys) arrays
+
+        Fewer cells are returned once blockers and bombs, plus `reserve` cells
+        kept for later, would cover more than max_fixed_density of the board.
+        Twice as many cells as needed are drawn without replacement and the
+        fixed ones dropped, which is almost always enough while the board is
+        mostly free, so the cost follows `count` rather than the board size;
+        if not, the cells are drawn from an index of all free cells. Nothing
+        is ever retried.
+        """
+        height, width = self.grid.shape
+        fixed = len(self.blocker_positions) + len(self.bomb_positions)
+        count = max(0, min(count, int(self.max_fixed_density * height * width) - fixed - reserve))
+
+        cells = self.rng.choice(height * width, size=min(height * width, 2 * count + 8), replace=False)
+        cells = cells[~IS_FIXED[self.grid[cells // width, cells % width]]][:count]
+        if len(cells) < count:
+            free = np.flatnonzero(~IS_FIXED[self.grid.ravel()])
+            cells = self.rng.choice(free, size=min(count, len(free)), replace=False)
+        ys, xs = np.divmod(cells, width)
+        return xs, ys
+
+    def place_fixed(self, tile, count, positions, reserve=0):
+        """Put `tile` on up to `count` random free cells and add them to `positions`"""
+        xs, ys = self.random_free_cells(count, reserve)
+        self.grid[ys, xs] = tile
+        self.legal_stale[ys, xs] = True
+        positions.update(zip(xs.tolist(), ys.tolist()))
+
+    def place_blockers_for_level(self):
+        self.blocker_positions.clear()
+
+        if self.level < 2:
+            return  # No blockers on level 1
+
+        # Leave room under max_fixed_density for the bombs placed after the blockers
+        self.place_fixed(BLOCKER, (self.level - 1) * self.blockers_per_level, self.blocker_positions,
+                         reserve=self.bombs_for_level())
+
+    def bombs_for_level(self):
+        # 1 bomb for every 2 levels
+        return max(1, self.level // self.levels_per_bomb)
+
+    def place_bombs(self):
+        """Place this level's number of new bombs on random free cells (bombs already placed stay)"""
+        self.place_fixed(BOMB, self.bombs_for_level(), self.bomb_positions)
+
+    def fill_match_free(self):
+        """Fill every cell without a blocker or bomb with candies that form no run, in one pass
+
+        Cells are filled in scan order, each with a random colour among those
+        that don't complete a run of 3 with its two left or two upper
+        neighbours, so the board comes out match-free without any retries.
+        """
+        height, width = self.grid.shape
+        free = ~IS_FIXED[self.grid]
+        picks = self.rng.random((height, width))
+        candies = np.zeros((height, width), dtype=np.int8)  # blockers and bombs stay EMPTY here, ending runs
+        colours = len(CANDY_TILES)
+
+        for y in range(height):
+            # Colour of the run of 2 above each cell (EMPTY, which is 0, if there is none)
+            if y >= 2:
+                above = np.where(candies[y - 1] == candies[y - 2], candies[y - 1], EMPTY).tolist()
+            else:
+                above = [EMPTY] * width
+            free_row = free[y].tolist()
+            pick_row = picks[y].tolist()
+            row = [EMPTY] * width
+            left1 = left2 = EMPTY
+            for x in range(width):
+                if not free_row[x]:
+                    left1, left2 = EMPTY, left1
+                    continue
+                # The forbidden colours, low < high (low, or both, EMPTY if there are fewer than two)
+                low = left1 if left1 == left2 else EMPTY
+                high = above[x]
+                if low > high:
+                    low, high = high, low
+                elif low == high:
+                    low = EMPTY
+                # Pick among the allowed colours by counting past the forbidden ones
+                tile = BLUE + int(pick_row[x] * (colours - (low > 0) - (high > 0)))
+                if low and tile >= low:
+                    tile += 1
+                if high and tile >= high:
+                    tile += 1
+                row[x] = tile
+                left1, left2 = tile, left1
+            candies[y] = row
+
+        self.grid[free] = candies[free]
+        self.dirty[...] = True
+        self.legal_stale[...] = True
+
+    def plant_legal_move(self):
+        """Recolour three candies so the board has a swap that creates a match; False if none fits
+
+        The move is two candies of one colour in a row with a third one
+        diagonally below the next cell, to be swapped up into it. Spots and
+        colours are tried in random order until one leaves the board match-free.
+        """
+        free = ~IS_FIXED[self.grid]
+        spots = np.flatnonzero(free[:-1, :-2] & free[:-1, 1:-1] & free[:-1, 2:] & free[1:, 2:])
+        for spot in self.rng.permutation(spots).tolist():
+            y, x = divmod(spot, self.grid.shape[1] - 2)
+            cells = (y, y, y + 1), (x, x + 1, x + 2)
+            before = self.grid[cells]
+            for candy in self.rng.permutation(CANDY_TILES).tolist():
+                self.grid[cells] = candy
+                if not self.check_matches():
+                    self.legal_stale[y:y + 2, x:x + 3] = True
+                    return True
+            self.grid[cells] = before
+        return False
+
+    def move_spot(self):
+        """(ys, xs) of the four cells of a random spot where plant_legal_move() fits (none on tiny boards)"""
+        height, width = self.grid.shape
+        if height < 2 or width < 3:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        y = int(self.rng.integers(height - 1))
+        x = int(self.rng.integers(width - 2))
+        return np.array([y, y, y, y + 1]), np.array([x, x + 1, x + 2, x + 2])
+
+    def ensure_no_matches_at_start(self):
+        """Re-draw matched candies until the board has none (for boards edited after reset_grid())"""
+        while True:
+            matches = self.check_matches()
+            if not matches:
+                break
+            # Re-draw just the matched candies; every pass breaks most runs,
+            # so this settles quickly even on large boards
+            xs, ys = match_cells(matches)
+            ys, xs = np.divmod(np.unique(ys * self.grid.shape[1] + xs), self.grid.shape[1])
+            self.grid[ys, xs] = self.random_candies(len(xs))
+            self.legal_stale[ys, xs] = True
+
+    def check_matches(self):
+        """Check for all matches on the board, ignoring blockers and bombs"""
+        scan = self.run_scan
+        if not scan.find():
+            return []
+
+        stride = self.cells.shape[1]
+        matches = []
+
+        # Check horizontal matches
+        for start, length in merge_runs(scan.horizontal(), 1):
+            y, x = divmod(start, stride)
+            matches.append([(x + i, y) for i in range(length)])
+
+        # Check vertical matches (column by column)
+        for start, length in merge_runs(scan.vertical(), stride):
+            y, x = divmod(start, stride)
+            matches.append([(x, y + i) for i in range(length)])
+
+        return matches
+
+    def check_dirty_matches(self):
+        """Check for matches, scanning only around the cells changed since the last call
+
+        Every swap and every refill marks the cells it changes. On a board that
+        was settled before those changes every new run passes through one of
+        them, so only the changed rows and columns need scanning, and only
+        within 2 cells of the changed area; a run reaching the edge of that
+        window is followed along the board. The result is the same as
+        check_matches() for work proportional to the changed area, which only
+        beats the full scan on large boards (see DIRTY_SCAN_MIN_SKIPPED).
+        """
+        rows = np.flatnonzero(self.dirty.any(axis=1))
+        cols = np.flatnonzero(self.dirty.any(axis=0))
+        self.dirty[...] = False
+        if not len(rows):
+            return []
+
+        height, width = self.dirty.shape
+        left, right = max(0, cols[0] - 2), min(width, cols[-1] + 3)
+        top, bottom = max(0, rows[0] - 2), min(height, rows[-1] + 3)
+        if height * width - len(rows) * (right - left) - len(cols) * (bottom - top) < DIRTY_SCAN_MIN_SKIPPED:
+            return self.check_matches()  # not enough cells skipped to pay for slicing out the lines
+
+        matches = []
+
+        # Check horizontal matches
+        for row, x, length in window_runs(self._grid, rows, left, right):
+            y = int(rows[row])
+            matches.append([(x + i, y) for i in range(length)])
+
+        # Check vertical matches
+        for col, y, length in window_runs(self._grid.T, cols, top, bottom):
+            x = int(cols[col])
+            matches.append([(x, y + i) for i in range(length)])
+
+        return matches
+
+    def check_bomb_adjacent(self, matches):
+        """Check if any matches are adjacent to bombs and deduct points
+
+        Returns the (xs, ys) arrays of the bombs that went off.
+        """
+        height, width = self.grid.shape
+        xs, ys = match_cells(matches)
+
+        # Every bomb next to a matched cell goes off once
+        near_x = np.concatenate((xs - 1, xs + 1, xs, xs))
+        near_y = np.concatenate((ys, ys, ys - 1, ys + 1))
+        inside = (near_x >= 0) & (near_x < width) & (near_y >= 0) & (near_y < height)
+        near = np.unique(near_y[inside] * width + near_x[inside])
+        bombs = near[self.grid.ravel()[near] == BOMB]
+
+        count = len(bombs)
+        ys, xs = np.divmod(bombs, width)
+        if count:
+            self.score = max(0, self.score - 30 * count)  # Deduct 30 points per bomb, don't go below 0
+            self.total_score = max(0, self.total_score - 30 * count)
+            # Remove the bombs
+            self.grid[ys, xs] = EMPTY
+            self.gap_columns[xs] = True
+            self.bomb_positions.difference_update(zip(xs.tolist(), ys.tolist()))
+        return xs, ys
+
+    def remove_matches(self, matches):
+        """Remove matched tiles and update score
+
+        Returns ((xs, ys) of the cleared cells, (xs, ys) of the bombs that
+        went off), or None if there were no matches.
+        """
+        if not matches:
+            return None
+
+        # First check for bombs adjacent to matches
+        bombs = self.check_bomb_adjacent(matches)
+
+        xs, ys = match_cells(matches)
+
+        # Score calculation (more points for longer matches)
+        for match in matches:
+            length = len(match)
+            if length == 3:
+                points = 50
+            elif length == 4:
+                points = 100
+            else:  # 5 or more
+                points = 150
+
+            self.score += points
+            self.total_score += points
+        height, width = self.grid.shape
+        ys, xs = np.divmod(np.unique(ys * width + xs), width)
+        cleared = ~IS_FIXED[self.grid[ys, xs]]
+        xs, ys = xs[cleared], ys[cleared]
+        self.grid[ys, xs] = EMPTY
+        self.gap_columns[xs] = True
+
+        return (xs, ys), bombs
+
+    def fill_empty_spaces(self):
+        """Let tiles fall into empty spaces and refill from the top, ignoring blockers and bombs
+
+        Only the columns that had cells cleared since the last fill are
+        compacted, all of them in one pass: blockers and bombs stay where
+        they are and the candies in between keep their order while sliding
+        into the lowest free cells. The grid is updated immediately and the
+        moves are returned as TileMoves arrays; new tiles have a negative
+        from_y (-1 is the row just above the board).
+        """
+        height, width = self.grid.shape
+        columns = np.flatnonzero(self.gap_columns)
+        self.gap_columns[...] = False
+
+        # Each column bottom-up, one column after the other
+        column_cells = self.grid[::-1, columns].T.ravel()
+        free = np.flatnonzero(~IS_FIXED[column_cells])
+        tiles = column_cells[free]
+
+        # Stable sort of the free cells of every column: candies first (bottom), then the gaps
+        order = np.argsort((free // height) * 2 + (tiles == EMPTY), kind='stable')
+        tiles = tiles[order]
+        moved = (order != np.arange(len(order))) & (tiles != EMPTY)
+        gaps = tiles == EMPTY
+
+        x = columns[free // height]
+        y = height - 1 - free % height
+        from_y = y[order[moved]]
+
+        # Refill the gaps top-first, column by column
+        spawn = np.flatnonzero(gaps)
+        spawn = spawn[np.lexsort((y[spawn], x[spawn]))]
+        spawn_x = x[spawn]
+        spawn_y = y[spawn]
+        spawn_tiles = self.draw_refill(spawn_x)
+
+        # 3% chance to spawn a bomb instead of candy (only if level > 1)
+        if self.level > 1 and len(spawn):
+            free_bombs = max(0, self.level // 2 + 1 - len(self.bomb_positions))
+            bombs = np.flatnonzero(self.rng.random(len(spawn)) < 0.03)[:free_bombs]
+            spawn_tiles[bombs] = BOMB
+            self.bomb_positions.update(zip(spawn_x[bombs].tolist(), spawn_y[bombs].tolist()))
+        tiles[spawn] = spawn_tiles
+
+        # New tiles enter stacked above the column in the order they land
+        counts = np.bincount(spawn_x, minlength=width)
+        first = np.cumsum(counts) - counts
+        spawn_from_y = np.arange(len(spawn)) - first[spawn_x] - counts[spawn_x]
+
+        column_cells[free] = tiles
+        self._grid[:, columns] = column_cells.reshape(len(columns), height).T[::-1]
+
+        moves = TileMoves(
+            np.concatenate((x[moved], spawn_x)),
+            np.concatenate((from_y, spawn_from_y)),
+            np.concatenate((y[moved], spawn_y)),
+            np.concatenate((tiles[moved], spawn_tiles)),
+        )
+        self.dirty[moves.to_y, moves.x] = True
+        self.legal_stale[moves.to_y, moves.x] = True
+        return moves
+
+    def draw_refill(self, columns):
+        """Next candy from each column's pre-generated refill stream, for a column-sorted array of columns"""
+        counts = np.bincount(columns, minlength=self.refill_streams.shape[0])
+        exhausted = np.flatnonzero(self.refill_next + counts > self.refill_streams.shape[1])
+        if len(exhausted):
+            self.refill_streams[exhausted] = self.random_candies((len(exhausted), self.refill_streams.shape[1]))
+            self.refill_next[exhausted] = 0
+
+        first = np.cumsum(counts) - counts
+        candies = self.refill_streams[columns, self.refill_next[columns] + np.arange(len(columns)) - first[columns]]
+        self.refill_next += counts
+        return candies
+
+    def resolve_steps(self, matches):
+        """Remove matches and refill until the board settles, in one pass with no animation
+
+        Returns a CascadeStep for every step, so a front end can animate the
+        cascade afterwards or skip straight to the settled board.
+        """
+        steps = []
+        while matches:
+            score_before = self.score
+            cleared, bombs = self.remove_matches(matches)
+            filled = self.fill_empty_spaces()
+            # fill_empty_spaces() lists the fallen tiles first, then the new ones
+            fallen = np.count_nonzero(filled.from_y >= 0)
+            steps.append(CascadeStep(matches, cleared, bombs, self.score - score_before,
+                                     TileMoves(*(a[:fallen] for a in filled)),
+                                     TileMoves(*(a[fallen:] for a in filled))))
+            matches = self.check_dirty_matches()
+        return steps
+
+    def resolve_cascade(self, matches):
+        """Remove matches and refill until the board settles; returns the matches of every step"""
+        return [step.matches for step in self.resolve_steps(matches)]
+
+    def is_adjacent(self, pos1, pos2):
+        """Check if two positions are adjacent"""
+
+        x1, y1 = pos1
+        x2, y2 = pos2
+        return (abs(x1 - x2) == 1 and y1 == y2) or (abs(y1 - y2) == 1 and x1 == x2)
+
+    def swap_tiles(self, pos1, pos2):
+        """Swap two tiles on the grid"""
+        x1, y1 = pos1
+        x2, y2 = pos2
+        self.grid[y1, x1], self.grid[y2, x2] = self.grid[y2, x2], self.grid[y1, x1]
+        self.dirty[y1, x1] = True
+        self.dirty[y2, x2] = True
+        self.legal_stale[y1, x1] = True
+        self.legal_stale[y2, x2] = True
+
+    def refresh_legal_moves(self):
+        """Bring the legal-move index up to date around the cells changed since the last refresh
+
+        A swap only depends on the cells up to 3 steps from its first cell, so
+        only swaps starting in the changed area grown by 3 are recomputed, from
+        a slice of the board grown by 3 more.
+        """
+        stale_rows = np.flatnonzero(self.legal_stale.any(axis=1))
+        if not len(stale_rows):
+            return
+        stale_cols = np.flatnonzero(self.legal_stale.any(axis=0))
+        self.legal_stale[...] = False
+
+        height, width = self.grid.shape
+        top, bottom = max(0, stale_rows[0] - 3), min(height, stale_rows[-1] + 4)
+        left, right = max(0, stale_cols[0] - 3), min(width, stale_cols[-1] + 4)
+        slice_top, slice_left = max(0, top - 3), max(0, left - 3)
+        east, south = swap_legality(self.grid[slice_top:min(height, bottom + 3), slice_left:min(width, right + 3)])
+
+        window = (slice(top - slice_top, bottom - slice_top), slice(left - slice_left, right - slice_left))
+        self.legal_east[top:bottom, left:right] = east[window]
+        self.legal_south[top:bottom, left:right] = south[window]
+
+    def is_legal_move(self, pos1, pos2):
+        """True if swapping the two tiles would create a match"""
+        if not self.is_adjacent(pos1, pos2):
+            return False
+        (x, y), other = sorted([pos1, pos2], key=lambda pos: (pos[1], pos[0]))
+        self.refresh_legal_moves()
+        if other[0] > x:
+            return bool(self.legal_east[y, x])
+        return bool(self.legal_south[y, x])
+
+    def legal_moves(self):
+        """All swaps that would create a match, as ((x1, y1), (x2, y2)) pairs in row-major order"""
+        self.refresh_legal_moves()
+        moves = []
+        east = self.legal_east
+        south = self.legal_south
+        for y, x in zip(*np.nonzero(east | south)):
+            x, y = int(x), int(y)
+            if east[y, x]:
+                moves.append(((x, y), (x + 1, y)))
+            if south[y, x]:
+                moves.append(((x, y), (x, y + 1)))
+        return moves
+
+    def has_legal_moves(self):
+        self.refresh_legal_moves()
+        return bool(self.legal_east.any() or self.legal_south.any())
+
+    def hint(self):
+        """The first swap (in legal_moves() order) that creates a match, or None on a dead board"""
+        self.refresh_legal_moves()
+        legal = self.legal_east | self.legal_south
+        if not legal.any():
+            return None
+        y, x = divmod(int(np.argmax(legal)), legal.shape[1])
+        if self.legal_east[y, x]:
+            return (x, y), (x + 1, y)
+        return (x, y), (x, y + 1)
+
+    def reshuffle_if_dead(self, attempts=100):
+        """Shuffle the candies in place when no swap can create a match
+
+        Candies are permuted among their own cells (blockers, bombs and the
+        colour counts stay the same) until the board has no matches and at
+        least one legal move. If no permutation does, the colours on the board
+        can't form a playable layout: new match-free candies are drawn and a
+        move is planted (which only fails if blockers leave no room for one).
+        Returns True if the board was reshuffled.
+        """
+        if self.has_legal_moves():
+            return False
+
+        candy_cells = np.nonzero(IS_CANDY[self.grid])
+        candies = self.grid[candy_cells]
+        for _ in range(attempts):
+            self.grid[candy_cells] = self.rng.permutation(candies)
+            self.legal_stale[...] = True
+            if not self.check_matches() and self.has_legal_moves():
+                break
+        else:
+            self.fill_match_free()
+            if not self.has_legal_moves():
+                self.plant_legal_move()
+        self.dirty[...] = False
+        return True
+
+    def apply_move(self, pos1, pos2):
+        """Play one swap to completion (including all cascades) and report what happened
+
+        A swap that wouldn't create a match is rejected up front from the
+        legal-move index and doesn't cost a move. If the board is dead once
+        the cascades settle, it is reshuffled.
+        """
+        if not self.is_legal_move(pos1, pos2):
+            return MoveResult(False, [], 0, {}, [])
+
+        before = self.grid.copy()
+        score_before = self.score
+
+        self.swap_tiles(pos1, pos2)
+        steps = self.resolve_steps(self.check_dirty_matches())
+        reshuffled = self.reshuffle_if_dead()
+
+        self.moves_remaining -= 1
+
+        # Only the swapped cells and the cells tiles fell into can have changed,
+        # unless the board was reshuffled
+        if reshuffled:
+            ys, xs = np.nonzero(before != self.grid)
+        else:
+            height, width = self.grid.shape
+            filled = [moves for step in steps for moves in (step.moves, step.spawns)]
+            xs = np.concatenate([[pos1[0], pos2[0]]] + [moves.x for moves in filled])
+            ys = np.concatenate([[pos1[1], pos2[1]]] + [moves.to_y for moves in filled])
+            ys, xs = np.divmod(np.unique(ys * width + xs), width)
+            changed = before[ys, xs] != self.grid[ys, xs]
+            ys, xs = ys[changed], xs[changed]
+        diff = {(x, y): int(self.grid[y, x]) for x, y in zip(xs.tolist(), ys.tolist())}
+
+        return MoveResult(True, [step.matches for step in steps], self.score - score_before, diff, steps)
+
+    def copy(self):
+        """Independent copy of the engine, including the RNG state (for lookahead)"""
+        clone = copy.copy(self)
+        bit_generator = type(self.rng.bit_generator)()
+        bit_generator.state = self.rng.bit_generator.state
+        clone.rng = np.random.Generator(bit_generator)
+        clone.cells = self.cells.copy()
+        clone._grid = clone.cells[:-2, :-1]
+        clone.run_scan = RunScan(clone.cells)
+        for name in ('dirty', 'gap_columns', 'legal_east', 'legal_south', 'legal_stale',
+                     'refill_streams', 'refill_next'):
+            setattr(clone, name, getattr(self, name).copy())
+        clone.blocker_positions = set(self.blocker_positions)
+        clone.bomb_positions = set(self.bomb_positions)
+        return clone
+
+    def is_level_completed(self):
+        return self.score >= self.target_score
+
+    def start_next_level(self, move_limit):
+        """Advance to the next level with a fresh board"""
+        self.move_limit = move_limit
+        self.level += 1
+        self.score = 0
+        self.moves_remaining = self.move_limit
+        self.reset_grid()
+
+    def reset_grid(self):
+        """A fresh board for the level: its blockers and bombs, then match-free candies with a legal move
+
+        Blockers and bombs of earlier levels are gone. One random spot where
+        plant_legal_move() fits is kept free of them; if the candies still
+        leave no way to plant a move there, blockers (then bombs) are taken
+        off one at a time until there is.
+        """
+        self.grid = EMPTY
+        self.bomb_positions.clear()
+        # Stand-in blockers on the spot, which aren't in blocker_positions and so don't count towards the cap
+        spot = self.move_spot()
+        self.grid[spot] = BLOCKER
+        self.place_blockers_for_level()
+        self.place_bombs()
+        self.grid[spot] = EMPTY
+        self.fill_match_free()
+        while not self.has_legal_moves() and not self.plant_legal_move():
+            positions = self.blocker_positions or self.bomb_positions
+            if not positions:
+                break  # the board is too small for any move
+            x, y = sorted(positions)[self.rng.integers(len(positions))]
+            positions.remove((x, y))
+            self.grid[y, x] = EMPTY
+            self.fill_match_free()
+        self.dirty[...] = False
+
+
+def new_engine(backend='auto', seed=None, size=GRID_SIZE):
+    """Create a board engine for a size x size board
+
+    backend is 'numpy' for GameEngine, 'bitboard' for BitboardEngine, or
+    'auto' to use bitboards whenever the board is 8x8.
+    """
+    if backend == 'auto':
+        backend = 'bitboard' if board_shape(size) == (8, 8) else 'numpy'
+    if backend == 'bitboard':
+        from BitboardEngine import BitboardEngine
+        return BitboardEngine(seed, size)
+    if backend == 'numpy':
+        return GameEngine(seed, size)
+    raise ValueError(f"Unknown engine backend: {backend}")
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import sqlite3
+
+PROFILE_DB = "profiles.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    highscore INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    score INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    played_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_by_highscore ON players(highscore DESC);
+CREATE INDEX IF NOT EXISTS players_by_last_seen ON players(last_seen DESC);
+CREATE INDEX IF NOT EXISTS games_by_player ON games(player_id, played_at DESC);
+CREATE INDEX IF NOT EXISTS games_by_score ON games(score DESC);
+"""
+
+
+class ProfileStore:
+    """Player profiles, game history and leaderboard in a SQLite database
+
+    The database runs in WAL mode and every write is a single transaction,
+    so a crash mid-write leaves either the old or the new data, never a
+    corrupt file. Leaderboard and rank queries are served from indexes.
+    """
+
+    def __init__(self, path=PROFILE_DB):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def get_player(self, name):
+        """{'name', 'highscore'} for `name`, or None"""
+        row = self.db.execute("SELECT name, highscore FROM players WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def use_player(self, name):
+        """Get or create the profile for `name` and make it the last active one"""
+        with self.db:
+            self.db.execute("INSERT INTO players (name, last_seen) VALUES (?, ?) "
+                            "ON CONFLICT(name) DO UPDATE SET last_seen = excluded.last_seen",
+                            (name, time.time()))
+        return self.get_player(name)
+
+    def last_player(self):
+        """Profile of the most recently active player, or None if there are no players yet"""
+        row = self.db.execute("SELECT name, highscore FROM players ORDER BY last_seen DESC LIMIT 1").fetchone()
+        return dict(row) if row else None
+
+    def record_game(self, name, score, level):
+        """Add a finished game to the player's history and return their (possibly new) high score"""
+        now = time.time()
+        with self.db:
+            self.db.execute("INSERT INTO players (name, highscore, last_seen) VALUES (?, ?, ?) "
+                            "ON CONFLICT(name) DO UPDATE SET "
+                            "highscore = max(highscore, excluded.highscore), last_seen = excluded.last_seen",
+                            (name, score, now))
+            self.db.execute("INSERT INTO games (player_id, score, level, played_at) "
+                            "SELECT id, ?, ?, ? FROM players WHERE name = ?",
+                            (score, level, now, name))
+        return self.get_player(name)['highscore']
+
+    def history(self, name, limit=10):
+        """The player's most recent games, newest first"""
+        rows = self.db.execute("SELECT games.score, games.level, games.played_at FROM games "
+                               "JOIN players ON players.id = games.player_id "
+                               "WHERE players.name = ? ORDER BY games.played_at DESC LIMIT ?",
+                               (name, limit))
+        return [dict(row) for row in rows]
+
+    def top_players(self, n=10):
+        """The n best players by high score"""
+        rows = self.db.execute("SELECT name, highscore FROM players ORDER BY highscore DESC, name LIMIT ?", (n,))
+        return [dict(row) for row in rows]
+
+    def top_games(self, n=10):
+        """The n highest-scoring games"""
+        rows = self.db.execute("SELECT players.name, games.score, games.level, games.played_at FROM games "
+                               "JOIN players ON players.id = games.player_id "
+                               "ORDER BY games.score DESC LIMIT ?", (n,))
+        return [dict(row) for row in rows]
+
+    def rank(self, name):
+        """1-based leaderboard position of the player's high score (ties share a rank), or None"""
+        player = self.get_player(name)
+        if player is None:
+            return None
+        above = self.db.execute("SELECT count(*) FROM players WHERE highscore > ?", (player['highscore'],))
+        return above.fetchone()[0] + 1
+
+    def migrate_json(self, path):
+        """Import a single-player save file from the old JSON format, then rename it
+
+        Returns the imported profile, or None if there was nothing to import.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            name, highscore = str(data['name']), int(data['highscore'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not migrate {path}: {e}")
+            return None
+
+        with self.db:
+            self.db.execute("INSERT INTO players (name, highscore, last_seen) VALUES (?, ?, ?) "
+                            "ON CONFLICT(name) DO UPDATE SET highscore = max(highscore, excluded.highscore)",
+                            (name, highscore, time.time()))
+        os.replace(path, path + '.migrated')
+        return self.get_player(name)
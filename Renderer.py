@@ -0,0 +1,169 @@
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+from GameEngine import EMPTY
+
+TEXT_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(font, text, color):
+    """Antialiased font.render() that rasterizes each (font, text, color) only once
+
+    The returned surface is shared between callers, so blit it but never draw on it.
+    """
+    return font.render(text, True, color)
+
+
+class BoardRenderer:
+    """Draws the board through an off-screen layer and pushes only the rects that changed
+
+    The static tiles live in `layer`, which is only touched for cells whose
+    tile changed since the last frame. Moving sprites (falling or swapping
+    tiles) and outlines are drawn on top of it every frame, and the screen
+    area they covered on the previous frame is restored from the layer.
+    present() then hands just those rects to pygame.display.update().
+
+    A board larger than `view_size` (in pixels) is shown through a
+    viewport of whole cells that scroll() moves; only the visible cells are
+    ever compared or drawn.
+    """
+
+    def __init__(self, screen, tile_images, grid_shape, tile_size, top, background, view_size=None):
+        self.screen = screen
+        self.tile_images = tile_images
+        self.tile_size = tile_size
+        self.top = top
+        self.background = background
+        self.grid_shape = grid_shape
+        rows, cols = grid_shape
+        if view_size is not None:
+            cols = min(cols, view_size[0] // tile_size)
+            rows = min(rows, view_size[1] // tile_size)
+        self.view_shape = (rows, cols)
+        self.view_x = self.view_y = 0  # board cell shown in the top left corner
+        self.board_rect = pygame.Rect(0, top, cols * tile_size, rows * tile_size)
+        self.layer = pygame.Surface(self.board_rect.size).convert()
+        self.layer.fill(background)
+        self.shown = np.full(self.view_shape, -1, dtype=np.int16)  # tile code drawn in each layer cell
+        self.decorations = ((), ())  # sprites and outlines drawn on the last frame
+        self.decoration_rects = []
+        self.hud_key = None
+        self.dirty = []
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Redraw everything on the next frame (after something else drew over the screen)"""
+        self.full_redraw = True
+        self.hud_key = None
+
+    def scroll(self, dx, dy):
+        """Move the viewport by whole cells, staying on the board; returns True if it moved"""
+        rows, cols = self.grid_shape
+        view_x = min(max(0, self.view_x + dx), cols - self.view_shape[1])
+        view_y = min(max(0, self.view_y + dy), rows - self.view_shape[0])
+        if (view_x, view_y) == (self.view_x, self.view_y):
+            return False
+        self.view_x, self.view_y = view_x, view_y
+        self.shown[...] = -1
+        self.full_redraw = True
+        return True
+
+    def visible(self, x, y):
+        return 0 <= x - self.view_x < self.view_shape[1] and 0 <= y - self.view_y < self.view_shape[0]
+
+    def cell_rect(self, x, y):
+        """Screen rect of board cell (x, y)"""
+        return pygame.Rect((x - self.view_x) * self.tile_size, (y - self.view_y) * self.tile_size + self.top,
+                           self.tile_size, self.tile_size)
+
+    def cell_at(self, pos):
+        """Board cell (x, y) under a screen position, or None outside the board"""
+        if not self.board_rect.collidepoint(pos):
+            return None
+        return (pos[0] // self.tile_size + self.view_x, (pos[1] - self.top) // self.tile_size + self.view_y)
+
+    def to_screen(self, x, y):
+        """Screen position of a board position in pixels (cell (x, y) starts at x * tile_size, y * tile_size)"""
+        return x - self.view_x * self.tile_size, y - self.view_y * self.tile_size + self.top
+
+    def sync_layer(self, grid, hidden):
+        """Redraw the layer cells whose tile changed, returning their screen rects"""
+        rows, cols = self.view_shape
+        wanted = grid[self.view_y:self.view_y + rows, self.view_x:self.view_x + cols].astype(np.int16)
+        for xs, ys in hidden:
+            xs = xs - self.view_x
+            ys = ys - self.view_y
+            inside = (xs >= 0) & (xs < cols) & (ys >= 0) & (ys < rows)
+            wanted[ys[inside], xs[inside]] = EMPTY
+        changed = np.argwhere(wanted != self.shown)
+        if not len(changed):
+            return []
+
+        tile = pygame.Rect(0, 0, self.tile_size, self.tile_size)
+        rects = []
+        blits = []
+        for y, x in changed.tolist():
+            layer_rect = pygame.Rect(x * self.tile_size, y * self.tile_size, self.tile_size, self.tile_size)
+            rects.append(layer_rect.move(0, self.top))
+            self.layer.fill(self.background, layer_rect)
+            image = self.tile_images[wanted[y, x]]
+            if image is not None:
+                blits.append((image, layer_rect, tile))
+        self.layer.blits(blits, doreturn=False)
+        self.shown = wanted
+        return rects
+
+    def draw_board(self, grid, hidden=(), sprites=(), outlines=()):
+        """Bring the board area up to date
+
+        `hidden` is a sequence of (xs, ys) index arrays of cells drawn
+        empty, `sprites` are (image, (x, y)) pairs in screen coordinates
+        clipped to the board and `outlines` are (color, rect) pairs drawn
+        last.
+        """
+        changed = self.sync_layer(grid, hidden)
+        decorations = (tuple(sprites), tuple(outlines))
+        if self.full_redraw:
+            # The board may not cover the whole screen below the HUD
+            self.screen.fill(self.background, pygame.Rect(0, self.top, self.screen.get_width(),
+                                                          self.screen.get_height() - self.top))
+            self.screen.blit(self.layer, self.board_rect)
+            self.dirty.append(self.screen.get_rect())
+        elif not changed and decorations == self.decorations:
+            return
+        else:
+            # Put the layer back under everything that changed or was drawn over last frame
+            restore = [rect.clip(self.board_rect) for rect in changed + self.decoration_rects]
+            self.screen.blits([(self.layer, rect, rect.move(0, -self.top)) for rect in restore], doreturn=False)
+            self.dirty.extend(restore)
+
+        rects = []
+        self.screen.set_clip(self.board_rect)
+        for image, pos in decorations[0]:
+            rects.append(self.screen.blit(image, pos))
+        self.screen.set_clip(None)
+        for color, rect in decorations[1]:
+            rects.append(pygame.draw.rect(self.screen, color, rect, 3))
+        self.decorations = decorations
+        self.decoration_rects = [rect.clip(self.board_rect) for rect in rects]
+        self.dirty.extend(self.decoration_rects)
+
+    def hud_changed(self, key):
+        """True if the HUD showing `key` needs to be redrawn, in which case its strip is marked dirty"""
+        if key == self.hud_key:
+            return False
+        self.hud_key = key
+        self.dirty.append(pygame.Rect(0, 0, self.screen.get_width(), self.top))
+        return True
+
+    def present(self):
+        """Push the dirty rects of this frame to the display"""
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        elif self.dirty:
+            pygame.display.update(self.dirty)
+        self.dirty = []
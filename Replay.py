@@ -0,0 +1,203 @@
+"""Seeded session logs and a tool to replay them
+
+A log holds everything needed to reproduce one game exactly: the seed of
+the board RNG, the AI model the game started with and every swap and
+"fast animations" switch with the logic step it was made on (fast
+animations skip the cascade animation, so they change the timing).
+Timer-driven events (bomb spawns, the level timer) follow from the seed
+and the simulated clock, so they are reproduced rather than stored. The log ends with the final score, level
+and a board checksum, which a replay is checked against.
+
+    python Replay.py replays/<file>.ccr            # as fast as possible, no display
+    python Replay.py replays/<file>.ccr --render   # watch it
+"""
+import os
+import sys
+import time
+import zlib
+import struct
+import argparse
+
+REPLAY_DIR = "replays"
+
+REPLAY_MAGIC = b'CCRP'
+# Bumped whenever board generation or move resolution changes: an older log would replay differently
+REPLAY_VERSION = 8
+HEADER = struct.Struct('<4sHQHHI')  # magic, version, seed, board width, board height, AI model size
+EVENT = struct.Struct('<IB')  # logic step, event type
+SWAP, END, FAST = 1, 2, 3
+SWAP_EVENT = struct.Struct('<HHB')  # x, y, direction (0: with x + 1, 1: with y + 1)
+END_EVENT = struct.Struct('<IHI')  # total score, level, board checksum
+FAST_EVENT = struct.Struct('<B')  # fast animations on (1) or off (0) from this step
+
+
+def board_checksum(grid):
+    return zlib.crc32(grid.tobytes())
+
+
+class ReplayLog:
+    """Compact binary record of one game: ~10 bytes per swap plus a small header"""
+
+    def __init__(self, seed, board_size, ai_model=b''):
+        self.seed = seed
+        self.board_size = board_size  # (width, height)
+        self.ai_model = ai_model  # AIModule.model_bytes() at the start of the game
+        self.swaps = []  # (step, (x1, y1), (x2, y2))
+        self.fast_switches = []  # (step, fast animations on)
+        self.end = None  # (step, total score, level, board checksum) once the game is over
+
+    def record_swap(self, step, pos1, pos2):
+        self.swaps.append((step, pos1, pos2))
+
+    def record_fast_animations(self, step, on):
+        self.fast_switches.append((step, on))
+
+    def finish(self, step, state):
+        self.end = (step, state.total_score, state.level, board_checksum(state.grid))
+
+    def to_bytes(self):
+        width, height = self.board_size
+        parts = [HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, width, height, len(self.ai_model)),
+                 self.ai_model]
+        for step, on in self.fast_switches:
+            parts.append(EVENT.pack(step, FAST) + FAST_EVENT.pack(on))
+        for step, (x1, y1), (x2, y2) in self.swaps:
+            direction = 0 if y1 == y2 else 1
+            parts.append(EVENT.pack(step, SWAP) + SWAP_EVENT.pack(min(x1, x2), min(y1, y2), direction))
+        if self.end:
+            step, total_score, level, checksum = self.end
+            parts.append(EVENT.pack(step, END) + END_EVENT.pack(total_score, level, checksum))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, width, height, ai_size = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError("not a replay file of a supported version")
+        offset = HEADER.size
+        log = cls(seed, (width, height), bytes(data[offset:offset + ai_size]))
+        offset += ai_size
+
+        while offset < len(data):
+            step, kind = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            if kind == SWAP:
+                x, y, direction = SWAP_EVENT.unpack_from(data, offset)
+                offset += SWAP_EVENT.size
+                log.swaps.append((step, (x, y), (x + 1, y) if direction == 0 else (x, y + 1)))
+            elif kind == FAST:
+                on, = FAST_EVENT.unpack_from(data, offset)
+                offset += FAST_EVENT.size
+                log.fast_switches.append((step, bool(on)))
+            elif kind == END:
+                log.end = (step,) + END_EVENT.unpack_from(data, offset)
+                offset += END_EVENT.size
+            else:
+                raise ValueError(f"unknown replay event {kind}")
+        return log
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def replay_path(log, name='player'):
+    """Where Game.py saves the log of a game"""
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(REPLAY_DIR, f"{stamp}_{name}_{log.seed}.ccr")
+
+
+def replay(log, render=False, speed=1.0):
+    """Re-run a logged game and return the final GameState
+
+    Headless replays run the logic as fast as possible; with `render` the
+    game is drawn in a window at `speed` times real time.
+    """
+    import Game
+    from AIModule import AIModule
+
+    ai = AIModule()
+    if log.ai_model:
+        ai.read_model(log.ai_model)
+
+    if render:
+        Game.init_display()
+    switches = list(reversed(log.fast_switches))
+    fast = bool(switches and switches[-1][0] == 0 and switches.pop()[1])
+    state = Game.GameState(ai, log.seed, tuple(log.board_size), fast)
+
+    swaps = list(reversed(log.swaps))
+    last_step = log.end[0] if log.end else None
+
+    def finished():
+        if last_step is not None:
+            return state.steps >= last_step
+        return not swaps and not state.animating
+
+    def step():
+        while swaps and swaps[-1][0] == state.steps:
+            _, pos1, pos2 = swaps.pop()
+            state.handle_swap(pos1, pos2)
+        # A switch logged at step n was made before the update that took the game to step n
+        while switches and switches[-1][0] == state.steps + 1:
+            state.set_fast_animations(switches.pop()[1])
+        if not finished():
+            state.update(Game.LOGIC_STEP)
+
+    if not render:
+        while not finished():
+            step()
+        return state
+
+    import pygame
+    accumulator = 0.0
+    while not finished():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return state
+        accumulator += Game.clock.tick(Game.FPS) * speed
+        while accumulator >= Game.LOGIC_STEP and not finished():
+            step()
+            accumulator -= Game.LOGIC_STEP
+        state.level_complete_pending = False
+        state.draw_all(Game.screen)
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded game")
+    parser.add_argument('log', help="replay file (.ccr)")
+    parser.add_argument('--render', action='store_true', help="show the game instead of running headless")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed when rendering (default 1.0)")
+    args = parser.parse_args(argv)
+
+    log = ReplayLog.load(args.log)
+    start = time.perf_counter()
+    state = replay(log, args.render, args.speed)
+    elapsed = time.perf_counter() - start
+
+    print(f"seed {log.seed}: {len(log.swaps)} swaps, {state.steps} logic steps in {elapsed:.2f}s "
+          f"({state.steps / max(elapsed, 1e-9):.0f} steps/s)")
+    print(f"final: total score {state.total_score}, level {state.level}")
+    if log.end is None:
+        print("log has no end record (game was not finished); nothing to verify")
+        return 0
+    _, total_score, level, checksum = log.end
+    if (state.total_score, state.level, board_checksum(state.grid)) != (total_score, level, checksum):
+        print(f"MISMATCH: recorded total score {total_score}, level {level}, board {checksum:08x}; "
+              f"replayed board {board_checksum(state.grid):08x}")
+        return 1
+    print("replay matches the recording")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
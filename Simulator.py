@@ -0,0 +1,195 @@
+"""Monte Carlo level-balancing simulator
+
+Plays many games per level with bot policies on the real board rules
+(GameEngine, the base of GameState) without a display, spread over a
+process pool, and reports win rate, moves used and score distributions.
+
+    python Simulator.py --levels 1-10 --games 2000 --policy random --policy greedy-cascade
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from GameEngine import GameEngine, new_engine
+
+# Tunable level parameters (the defaults are the game's)
+LevelConfig = namedtuple('LevelConfig', ['target_score', 'move_limit', 'blockers_per_level', 'levels_per_bomb',
+                                         'max_fixed_density'])
+DEFAULT_CONFIG = LevelConfig(1000, 20, GameEngine.blockers_per_level, GameEngine.levels_per_bomb,
+                             GameEngine.max_fixed_density)
+
+# Games per task sent to a worker process
+CHUNK_GAMES = 25
+
+
+# Bot policies: pick one of the legal `moves` for `engine`.
+# The greedy bots look ahead on a copy of the engine, which knows the upcoming
+# refills, so they play somewhat better than a human could.
+def random_policy(engine, moves, rng):
+    return moves[rng.integers(len(moves))]
+
+
+def greedy_score_policy(engine, moves, rng):
+    """The move that scores the most points, cascades included"""
+    return max(moves, key=lambda move: engine.copy().apply_move(*move).score_delta)
+
+
+def greedy_cascade_policy(engine, moves, rng):
+    """The move with the longest cascade, ties broken by score"""
+    def outcome(move):
+        result = engine.copy().apply_move(*move)
+        return len(result.cascade), result.score_delta
+    return max(moves, key=outcome)
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy-score': greedy_score_policy,
+    'greedy-cascade': greedy_cascade_policy,
+}
+
+
+def start_level(engine, level, config):
+    """Set the engine up for a fresh board at `level` with the given tuning"""
+    engine.level = level
+    engine.target_score = config.target_score
+    engine.move_limit = config.move_limit
+    engine.moves_remaining = config.move_limit
+    engine.blockers_per_level = config.blockers_per_level
+    engine.levels_per_bomb = config.levels_per_bomb
+    engine.max_fixed_density = config.max_fixed_density
+    engine.reset_grid()
+
+
+def play_game(policy, level, config, seed, backend='auto'):
+    """Play one level until it is won or out of moves; returns (won, moves used, score)
+
+    Time limits and the timed bomb spawns of the real game are not modelled.
+    """
+    board_seed, bot_seed = np.random.SeedSequence(seed).spawn(2)
+    engine = new_engine(backend, board_seed)
+    start_level(engine, level, config)
+    rng = np.random.default_rng(bot_seed)
+    choose = POLICIES[policy]
+
+    while engine.moves_remaining > 0 and not engine.is_level_completed():
+        moves = engine.legal_moves()
+        if not moves:
+            break
+        engine.apply_move(*choose(engine, moves, rng))
+
+    return engine.is_level_completed(), engine.move_limit - engine.moves_remaining, engine.score
+
+
+def play_games(task):
+    """Worker entry point: play the games of one (policy, level) chunk"""
+    policy, level, config, base_seed, first_game, count, backend = task
+    # Game i of a level gets the same boards under every policy
+    return policy, level, [play_game(policy, level, config, [base_seed, level, game], backend)
+                           for game in range(first_game, first_game + count)]
+
+
+def summarize(results):
+    won, moves_used, scores = (np.array(column) for column in zip(*results))
+    return {
+        'games': len(results),
+        'win_rate': float(won.mean()),
+        'moves_used': {'mean': float(moves_used.mean()),
+                       'p50': float(np.percentile(moves_used, 50)),
+                       'p90': float(np.percentile(moves_used, 90))},
+        'score': {'mean': float(scores.mean()),
+                  'p10': float(np.percentile(scores, 10)),
+                  'p50': float(np.percentile(scores, 50)),
+                  'p90': float(np.percentile(scores, 90))},
+    }
+
+
+def run(policies, levels, games, config=DEFAULT_CONFIG, workers=None, seed=0, backend='auto'):
+    """Simulate `games` games per policy and level; returns {policy: {level: summary}}"""
+    tasks = [(policy, level, config, seed, first, min(CHUNK_GAMES, games - first), backend)
+             for policy in policies
+             for level in levels
+             for first in range(0, games, CHUNK_GAMES)]
+
+    results = {(policy, level): [] for policy in policies for level in levels}
+    if workers == 1:
+        chunks = map(play_games, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunks = pool.map(play_games, tasks)
+    try:
+        for policy, level, chunk in chunks:
+            results[policy, level].extend(chunk)
+    finally:
+        if workers != 1:
+            pool.shutdown()
+
+    return {policy: {level: summarize(results[policy, level]) for level in levels} for policy in policies}
+
+
+def parse_levels(text):
+    """'1-10' or '1,3,5' (or a mix) -> sorted list of levels"""
+    levels = set()
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        levels.update(range(int(first), int(last or first) + 1))
+    return sorted(levels)
+
+
+def print_report(report):
+    for policy, per_level in report.items():
+        print(f"\nPolicy: {policy}")
+        print(f"{'level':>5}{'games':>7}{'win %':>7}{'moves mean':>12}{'p50':>6}{'p90':>6}"
+              f"{'score mean':>12}{'p10':>7}{'p50':>7}{'p90':>7}")
+        for level, s in per_level.items():
+            moves, score = s['moves_used'], s['score']
+            print(f"{level:>5}{s['games']:>7}{s['win_rate'] * 100:>7.1f}"
+                  f"{moves['mean']:>12.1f}{moves['p50']:>6.0f}{moves['p90']:>6.0f}"
+                  f"{score['mean']:>12.0f}{score['p10']:>7.0f}{score['p50']:>7.0f}{score['p90']:>7.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many bot games per level and report the balance")
+    parser.add_argument('--levels', type=parse_levels, default=parse_levels('1-10'),
+                        help="levels to simulate, e.g. 1-10 or 1,3,5 (default 1-10)")
+    parser.add_argument('--games', type=int, default=1000, help="games per policy and level (default 1000)")
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES),
+                        help="bot policy, may be repeated (default: all)")
+    parser.add_argument('--target-score', type=int, default=DEFAULT_CONFIG.target_score)
+    parser.add_argument('--move-limit', type=int, default=DEFAULT_CONFIG.move_limit)
+    parser.add_argument('--blockers-per-level', type=int, default=DEFAULT_CONFIG.blockers_per_level)
+    parser.add_argument('--levels-per-bomb', type=int, default=DEFAULT_CONFIG.levels_per_bomb)
+    parser.add_argument('--max-fixed-density', type=float, default=DEFAULT_CONFIG.max_fixed_density,
+                        help="largest share of the board covered by blockers and bombs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument('--seed', type=int, default=0, help="base seed; the same seed replays the same games")
+    parser.add_argument('--backend', choices=('auto', 'numpy', 'bitboard'), default='auto')
+    parser.add_argument('--json', metavar='PATH', help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    policies = args.policy or list(POLICIES)
+    config = LevelConfig(args.target_score, args.move_limit, args.blockers_per_level, args.levels_per_bomb,
+                         args.max_fixed_density)
+
+    start = time.perf_counter()
+    report = run(policies, args.levels, args.games, config, args.workers, args.seed, args.backend)
+    elapsed = time.perf_counter() - start
+
+    print_report(report)
+    total = len(policies) * len(args.levels) * args.games
+    print(f"\n{total} games in {elapsed:.1f}s with {args.workers} workers")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': config._asdict(), 'seed': args.seed, 'report': report}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
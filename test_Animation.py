@@ -0,0 +1,47 @@
+"""Checks of the falling-tile buffers against plain boolean indexing
+
+    python -m pytest -q
+"""
+import numpy as np
+
+from Animation import FallingTiles
+
+
+def test_cells_survive_positions():
+    """draw_all() takes cells() first and positions() second; the second call mustn't overwrite the first"""
+    falling = FallingTiles(3)
+    falling.start(np.array([1, 2, 3]), np.array([-50.0, -50.0, -50.0]), np.array([0, 1, 2]),
+                  np.array([0.0, 75.0, 150.0]), np.array([1, 2, 3]))
+    xs, rows = falling.cells()
+    falling.positions(0.5, 75, (10, 50), (-75, -25, 600, 650))
+    assert xs.tolist() == [1, 2, 3]
+    assert rows.tolist() == [0, 1, 2]
+
+
+def test_buffers_match_indexing():
+    rng = np.random.default_rng(0)
+    falling = FallingTiles(2000)
+    for _ in range(200):
+        if not falling.busy or rng.random() < 0.2:
+            count = int(rng.integers(1, 20))
+            x = rng.integers(0, 20, count)
+            target = rng.integers(0, 20, count)
+            y = (target - rng.integers(1, 10, count)) * 32
+            falling.start(x, y, target, target * 32, rng.integers(0, 7, count))
+        falling.advance(float(rng.uniform(1, 40)))
+
+        active = falling.falling[:falling.count].copy()
+        column = falling.x[:falling.count][active]
+        prev_y = falling.prev_y[:falling.count][active]
+        y = prev_y + (falling.y[:falling.count][active] - prev_y) * 0.3
+        tile = falling.tile[:falling.count][active]
+        screen_x, screen_y = column * 32 - 64, y - 46
+        shown = (screen_x > -32) & (screen_x < 300) & (screen_y > 18) & (screen_y < 400)
+
+        xs, rows = falling.cells()
+        sprite_x, sprite_y, tiles = falling.positions(0.3, 32, (-64, -46), (-32, 18, 300, 400))
+        assert np.array_equal(xs, column)
+        assert np.array_equal(rows, falling.target[:falling.count][active])
+        assert np.array_equal(sprite_x, screen_x[shown])
+        assert np.allclose(sprite_y, screen_y[shown])
+        assert np.array_equal(tiles, tile[shown])
@@ -0,0 +1,58 @@
+"""Seeded random games played side by side on BitboardEngine and GameEngine
+
+    python -m pytest -q
+"""
+import numpy as np
+import pytest
+
+from GameEngine import new_engine
+
+
+def start(backend, seed, level):
+    engine = new_engine(backend, seed)
+    engine.level = level
+    engine.reset_grid()
+    return engine
+
+
+def assert_same(bitboard, numpy):
+    assert np.array_equal(bitboard.grid, numpy.grid)
+    assert bitboard.score == numpy.score
+    assert bitboard.total_score == numpy.total_score
+    assert bitboard.moves_remaining == numpy.moves_remaining
+    assert bitboard.bomb_positions == numpy.bomb_positions
+    assert bitboard.legal_moves() == numpy.legal_moves()
+
+
+@pytest.mark.parametrize('level', [1, 4, 9, 16])
+@pytest.mark.parametrize('seed', range(4))
+def test_backends_play_the_same_game(seed, level):
+    """Every step of a random game leaves both backends with the same board, score, cascades and moves"""
+    bitboard = start('bitboard', seed, level)
+    numpy = start('numpy', seed, level)
+    assert_same(bitboard, numpy)
+
+    rng = np.random.default_rng(seed)
+    for turn in range(40):
+        moves = numpy.legal_moves()
+        if rng.random() < 0.1:
+            # An adjacent swap picked blindly, usually rejected
+            x, y = (int(v) for v in rng.integers(7, size=2))
+            move = ((x, y), (x + 1, y))
+        else:
+            move = moves[int(rng.integers(len(moves)))]
+
+        expected = numpy.apply_move(*move)
+        result = bitboard.apply_move(*move)
+        assert result.valid == expected.valid
+        assert result.cascade == expected.cascade
+        assert result.score_delta == expected.score_delta
+        assert result.diff == expected.diff
+        assert_same(bitboard, numpy)
+
+        if turn % 10 == 9:
+            # Timed bomb spawn, as the game does every 10 seconds (bomb_spawn_interval)
+            for engine in (bitboard, numpy):
+                engine.place_bombs()
+                engine.reshuffle_if_dead()
+            assert_same(bitboard, numpy)
@@ -0,0 +1,87 @@
+"""Checks of GameEngine's board generation, and of its incremental paths against the full computations they replace
+
+    python -m pytest -q
+"""
+import numpy as np
+import pytest
+
+import GameEngine
+from GameEngine import new_engine, BLOCKER, BOMB
+
+
+def sorted_matches(matches):
+    return sorted(tuple(match) for match in matches)
+
+
+@pytest.mark.parametrize('size', [8, (12, 8), 64, (100, 40), (5, 200)])
+@pytest.mark.parametrize('incremental_only', [False, True])
+def test_dirty_scan_matches_full_scan(size, incremental_only, monkeypatch):
+    """check_dirty_matches() finds exactly what check_matches() finds after every swap and refill"""
+    if incremental_only:
+        # Take the incremental path even where the full-scan fallback would kick in
+        monkeypatch.setattr(GameEngine, 'DIRTY_SCAN_MIN_SKIPPED', 0)
+    for seed in range(3):
+        engine = new_engine('numpy', seed, size)
+        rng = np.random.default_rng(seed)
+        for _ in range(15):
+            moves = engine.legal_moves()
+            if not moves:
+                break
+            engine.swap_tiles(*moves[int(rng.integers(len(moves)))])
+            while True:
+                full = engine.check_matches()
+                matches = engine.check_dirty_matches()
+                assert sorted_matches(matches) == sorted_matches(full)
+                if not matches:
+                    break
+                engine.remove_matches(matches)
+                engine.fill_empty_spaces()
+            assert not engine.check_matches()
+
+
+def assert_playable(engine):
+    """Match-free, at least one legal move, and the blocker/bomb sets agree with the grid"""
+    assert not engine.check_matches()
+    assert engine.has_legal_moves()
+    assert engine.blocker_positions == {(int(x), int(y)) for y, x in zip(*np.nonzero(engine.grid == BLOCKER))}
+    assert engine.bomb_positions == {(int(x), int(y)) for y, x in zip(*np.nonzero(engine.grid == BOMB))}
+
+
+@pytest.mark.parametrize('size', [8, (12, 8), (5, 20)])
+def test_reset_grid_is_playable(size):
+    """Every level's fresh board is match-free and has a legal move"""
+    for seed in range(20):
+        engine = new_engine('numpy', seed, size)
+        for level in range(1, 61, 3):
+            engine.level = level
+            engine.reset_grid()
+            assert_playable(engine)
+
+
+@pytest.mark.parametrize('density', [0.9, 1.0])
+def test_reset_grid_takes_off_blockers_with_no_room_for_a_move(density, monkeypatch):
+    """With blockers and bombs allowed over (nearly) the whole board, some are taken off to plant a move"""
+    monkeypatch.setattr(GameEngine.GameEngine, 'max_fixed_density', density)
+    for seed in range(20):
+        engine = new_engine('numpy', seed)
+        for level in (20, 40, 60):
+            engine.level = level
+            engine.reset_grid()
+            assert_playable(engine)
+
+
+def test_default_density_leaves_room_for_a_move():
+    """On 8x8 no blockers need taking off at the default cap, and timed bomb spawns leave the board playable"""
+    for seed in range(20):
+        engine = new_engine('numpy', seed)
+        cap = int(engine.max_fixed_density * engine.grid.size)
+        for level in range(1, 61, 3):
+            engine.level = level
+            engine.reset_grid()
+            wanted = (level - 1) * engine.blockers_per_level if level > 1 else 0
+            fixed = len(engine.blocker_positions) + len(engine.bomb_positions)
+            assert fixed == min(cap, wanted + engine.bombs_for_level())
+            for _ in range(10):
+                engine.place_bombs()
+                engine.reshuffle_if_dead()
+                assert_playable(engine)